@@ -1,23 +1,48 @@
 # backend/app/main.py
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
 
-from .db import Base, engine
+from .db import engine, read_engine, AsyncSessionLocal
+from .migrations import ensure_schema
 from .routers import auth, users, recommendations, analytics, photos, profile
 from .routers import chat as chat_router
 from .routers import likes as likes_router
-
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+from .services.profile_index import profile_index
+from .services.cache import response_cache
+from .services.chat_hub import chat_hub
+from .services.membership import conversation_members
+from .services.photo_variants import photo_pipeline
+from .services.ml import MLClient, ml_results
+from .services.precompute import precompute_worker
+from .services.scoring import scoring_engine
+from .security import hash_pool, token_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_tables()
-    yield
+    # Схему создают/обновляют миграции (python -m backend.app.migrations)
+    await ensure_schema()
+    async with AsyncSessionLocal() as session:
+        await profile_index.load(session)
+    scoring_engine.build()
+    app.state.ml_client = MLClient()
+    await app.state.ml_client.start()
+    await precompute_worker.start(app.state.ml_client)
+    await chat_hub.start()
+    await photo_pipeline.start()
+    try:
+        yield
+    finally:
+        await precompute_worker.stop()
+        await photo_pipeline.stop()
+        hash_pool.shutdown()
+        await app.state.ml_client.aclose()
+        await response_cache.close()
+        await chat_hub.close()
+        await read_engine.dispose()
+        await engine.dispose()
 
 app = FastAPI(title="TITANIT API", version="0.2.0", lifespan=lifespan)
 
@@ -44,6 +69,21 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics(request: Request):
+    ml_client = getattr(request.app.state, "ml_client", None)
+    return {
+        "cache": response_cache.stats(),
+        "ml": ml_client.stats() if ml_client else None,
+        "ml_cache": ml_results.stats(),
+        "precompute": precompute_worker.stats(),
+        "password_hashing": hash_pool.stats(),
+        "auth_tokens": token_cache.stats(),
+        "chat_hub": chat_hub.stats(),
+        "chat_membership": conversation_members.stats(),
+        "photos": photo_pipeline.stats(),
+    }
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to TITANIT API"}
@@ -0,0 +1,364 @@
+# backend/app/migrations.py
+"""
+Версионированные миграции схемы.
+
+Применяются отдельной командой до запуска сервера:
+
+    python -m backend.app.migrations
+
+При старте приложение только сверяет номер версии в таблице schema_version
+(см. ensure_schema в main.py). Миграции идемпотентны: индексы создаются
+через IF NOT EXISTS, поэтому их можно накатывать и на базы, созданные
+раньше через create_all.
+"""
+
+import asyncio
+import os
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, func, inspect, literal, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .db import Base, engine
+from . import models  # noqa: F401  (регистрирует таблицы в Base.metadata)
+from .services.facet_counts import ALL_CITIES
+from .services.profile_tokens import FACETS, facets_of
+
+# Для разработки: накатить миграции прямо при старте вместо отказа запускаться
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "0") in ("1", "true", "yes")
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version",
+    _meta,
+    Column("version", Integer, nullable=False),
+)
+
+
+def _baseline(conn: Connection) -> None:
+    # Таблицы, которых ещё нет (новая база или база до появления миграций)
+    Base.metadata.create_all(conn)
+
+
+def _hot_path_indexes(conn: Connection) -> None:
+    # Дубликаты профилей (гонка при первом GET /profile) мешают уникальному индексу
+    conn.execute(text(
+        "DELETE FROM profiles WHERE id NOT IN "
+        "(SELECT MIN(id) FROM profiles GROUP BY user_id)"
+    ))
+    # Неуникальный индекс по user_id заменяется уникальным
+    conn.execute(text("DROP INDEX IF EXISTS ix_profiles_user_id"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_profiles_user_id ON profiles (user_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation_created "
+        "ON messages (conversation_id, created_at)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_user_photos_user_primary_order "
+        "ON user_photos (user_id, is_primary, upload_order)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_likes_to_from_like "
+        "ON likes (to_user_id, from_user_id, is_like)"
+    ))
+
+
+def _messages_keyset_index(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_id "
+        "ON messages (conversation_id, id)"
+    ))
+
+
+def _conversation_inbox(conn: Connection) -> None:
+    timestamp = DateTime(timezone=True).compile(dialect=conn.dialect)
+    for column, ddl in (
+        ("last_message_id", "INTEGER"),
+        ("last_activity_at", timestamp),
+        ("user1_last_read_id", "INTEGER NOT NULL DEFAULT 0"),
+        ("user2_last_read_id", "INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if not has_column(conn, "conversations", column):
+            conn.execute(text(f"ALTER TABLE conversations ADD COLUMN {column} {ddl}"))
+    # Существующая история считается прочитанной, иначе у всех появятся старые непрочитанные
+    conn.execute(text(
+        "UPDATE conversations SET "
+        "last_message_id = (SELECT MAX(m.id) FROM messages m WHERE m.conversation_id = conversations.id), "
+        "last_activity_at = COALESCE("
+        "(SELECT MAX(m.created_at) FROM messages m WHERE m.conversation_id = conversations.id), "
+        "conversations.created_at)"
+    ))
+    if conn.dialect.name == "sqlite":
+        # CURRENT_TIMESTAMP без микросекунд -> формат, в котором SQLAlchemy пишет DateTime
+        conn.execute(text(
+            "UPDATE conversations SET last_activity_at = "
+            "strftime('%Y-%m-%d %H:%M:%f', last_activity_at) || '000' "
+            "WHERE last_activity_at IS NOT NULL"
+        ))
+    conn.execute(text(
+        "UPDATE conversations SET "
+        "user1_last_read_id = COALESCE(last_message_id, 0), "
+        "user2_last_read_id = COALESCE(last_message_id, 0)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user1_activity "
+        "ON conversations (user1_id, last_activity_at, id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user2_activity "
+        "ON conversations (user2_id, last_activity_at, id)"
+    ))
+
+
+_FTS_MEMBERS = "'u' || c.user1_id || ' u' || c.user2_id"
+
+
+def _messages_fts_triggers(conn: Connection) -> None:
+    conv_members = (
+        f"(SELECT {_FTS_MEMBERS} FROM conversations c WHERE c.id = {{row}}.conversation_id)"
+    )
+    # Contentless-таблица: при удалении нужно передать исходные значения колонок
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, body, members) "
+        f"VALUES (new.id, new.body, {conv_members.format(row='new')}); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, body, members) "
+        f"VALUES ('delete', old.id, old.body, {conv_members.format(row='old')}); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF body ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, body, members) "
+        f"VALUES ('delete', old.id, old.body, {conv_members.format(row='old')}); "
+        "INSERT INTO messages_fts(rowid, body, members) "
+        f"VALUES (new.id, new.body, {conv_members.format(row='new')}); END"
+    ))
+
+
+def _messages_fts(conn: Connection) -> None:
+    # Полнотекстовый поиск (services/message_search.py) есть только на SQLite
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts "
+        "USING fts5(body, members, content='', tokenize='unicode61 remove_diacritics 2')"
+    ))
+    _messages_fts_triggers(conn)
+    conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')"))
+    conn.execute(text(
+        "INSERT INTO messages_fts(rowid, body, members) "
+        f"SELECT m.id, m.body, {_FTS_MEMBERS} FROM messages m "
+        "JOIN conversations c ON c.id = m.conversation_id"
+    ))
+
+
+def _photo_variants(conn: Connection) -> None:
+    for column in ("avatar_path", "card_path", "full_path"):
+        if not has_column(conn, "user_photos", column):
+            conn.execute(text(f"ALTER TABLE user_photos ADD COLUMN {column} VARCHAR(500)"))
+
+
+def _messages_autoincrement(conn: Connection) -> None:
+    # На PostgreSQL id из sequence и так не переиспользуются
+    if conn.dialect.name != "sqlite":
+        return
+    ddl = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+    )).scalar() or ""
+    if "AUTOINCREMENT" in ddl.upper():
+        return
+    # Без AUTOINCREMENT SQLite отдаёт id удалённого последнего сообщения следующему.
+    # ALTER TABLE не умеет добавить AUTOINCREMENT — таблица пересоздаётся
+    # (id сохраняются, поэтому FTS-индекс по rowid остаётся верным)
+    for trigger in ("messages_fts_ai", "messages_fts_ad", "messages_fts_au"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    conn.execute(text("ALTER TABLE messages RENAME TO messages_old"))
+    indexes = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'messages_old' AND sql IS NOT NULL"
+    )).scalars().all()
+    for name in indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    models.Message.__table__.create(conn)
+    conn.execute(text(
+        "INSERT INTO messages (id, conversation_id, sender_id, body, created_at) "
+        "SELECT id, conversation_id, sender_id, body, created_at FROM messages_old"
+    ))
+    # Уже выданные id (в том числе удалённых сообщений) могли остаться в отметках
+    # прочтения и last_message_id — новые id должны быть больше любого из них
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'messages'"))
+    conn.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'messages', MAX("
+        "COALESCE((SELECT MAX(id) FROM messages_old), 0), "
+        "COALESCE((SELECT MAX(last_message_id) FROM conversations), 0), "
+        "COALESCE((SELECT MAX(user1_last_read_id) FROM conversations), 0), "
+        "COALESCE((SELECT MAX(user2_last_read_id) FROM conversations), 0))"
+    ))
+    conn.execute(text("DROP TABLE messages_old"))
+    if inspect(conn).has_table("messages_fts"):
+        _messages_fts_triggers(conn)
+
+
+def _insert(conn: Connection, model):
+    # INSERT ... ON CONFLICT диалекта соединения миграции
+    return (postgresql if conn.dialect.name == "postgresql" else sqlite).insert(model)
+
+
+def _chunks(items: list, size: int = 500):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _profile_tokens_backfill(conn: Connection) -> None:
+    # Профили, сохранённые до появления profile_tokens (раньше это делал lifespan)
+    Profile, ProfileToken, Token = models.Profile, models.ProfileToken, models.Token
+    has_tokens = select(ProfileToken.user_id).where(ProfileToken.user_id == Profile.user_id).exists()
+    res = conn.execute(
+        select(Profile.user_id, Profile.interests, Profile.skills, Profile.goals)
+        .where(~has_tokens)
+        .where(or_(Profile.interests != "", Profile.skills != "", Profile.goals != ""))
+    )
+    rows = []
+    for uid, interests, skills, goals in res.all():
+        for facet, tokens in zip(FACETS, facets_of(interests, skills, goals)):
+            rows.extend((uid, facet, t) for t in tokens)
+    if not rows:
+        return
+    words = sorted({t for _, _, t in rows})
+    ids = {}
+    for chunk in _chunks(words):
+        conn.execute(_insert(conn, Token).values([{"text": t} for t in chunk]).on_conflict_do_nothing())
+        ids.update(conn.execute(select(Token.text, Token.id).where(Token.text.in_(chunk))).all())
+    for chunk in _chunks(rows):
+        conn.execute(
+            _insert(conn, ProfileToken)
+            .values([{"user_id": uid, "facet": facet, "token_id": ids[t]} for uid, facet, t in chunk])
+            .on_conflict_do_nothing()
+        )
+
+
+def _facet_counts_rebuild(conn: Connection) -> None:
+    # Агрегат для аналитики по уже токенизированным профилям (раньше — в lifespan);
+    # дальше его инкрементально ведёт facet_counts.apply_change
+    FacetCount, Profile, ProfileToken, Token = (
+        models.FacetCount, models.Profile, models.ProfileToken, models.Token,
+    )
+    cols = [FacetCount.facet, FacetCount.city, FacetCount.token, FacetCount.count]
+    conn.execute(FacetCount.__table__.delete())
+    conn.execute(
+        FacetCount.__table__.insert().from_select(
+            cols,
+            select(ProfileToken.facet, literal(ALL_CITIES), Token.text, func.count())
+            .join(Token, Token.id == ProfileToken.token_id)
+            .group_by(ProfileToken.facet, Token.id, Token.text),
+        )
+    )
+    conn.execute(
+        FacetCount.__table__.insert().from_select(
+            cols,
+            select(ProfileToken.facet, Profile.city, Token.text, func.count())
+            .join(Token, Token.id == ProfileToken.token_id)
+            .join(Profile, Profile.user_id == ProfileToken.user_id)
+            .where(Profile.city.is_not(None), Profile.city != ALL_CITIES)
+            .group_by(ProfileToken.facet, Profile.city, Token.id, Token.text),
+        )
+    )
+
+
+def _photo_variants_status(conn: Connection) -> None:
+    if not has_column(conn, "user_photos", "variants_status"):
+        conn.execute(text(
+            "ALTER TABLE user_photos ADD COLUMN variants_status VARCHAR(16) NOT NULL DEFAULT 'pending'"
+        ))
+        # Уже обработанные до миграции фото
+        conn.execute(text(
+            "UPDATE user_photos SET variants_status = 'done' WHERE avatar_path IS NOT NULL"
+        ))
+    if not has_column(conn, "user_photos", "variants_error"):
+        conn.execute(text("ALTER TABLE user_photos ADD COLUMN variants_error VARCHAR(500)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_user_photos_variants_status_id "
+        "ON user_photos (variants_status, id)"
+    ))
+
+
+# (версия, описание, функция) — только добавлять в конец
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline tables", _baseline),
+    (2, "hot-path indexes", _hot_path_indexes),
+    (3, "messages keyset index", _messages_keyset_index),
+    (4, "conversation inbox columns", _conversation_inbox),
+    (5, "messages full-text index", _messages_fts),
+    (6, "photo variant paths", _photo_variants),
+    (7, "monotonic message ids", _messages_autoincrement),
+    (8, "profile tokens backfill", _profile_tokens_backfill),
+    (9, "facet counts aggregate", _facet_counts_rebuild),
+    (10, "photo variants status", _photo_variants_status),
+]
+HEAD = MIGRATIONS[-1][0]
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    """Для миграций ADD COLUMN: у новой базы колонка уже создана в baseline."""
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+
+def _set_version(conn: Connection, version: int) -> None:
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+async def current_version(db_engine: AsyncEngine = engine) -> int:
+    async with db_engine.connect() as conn:
+        return await conn.run_sync(_current_version)
+
+
+async def upgrade(db_engine: AsyncEngine = engine) -> int:
+    """Накатывает недостающие миграции, каждую в своей транзакции. Возвращает версию."""
+    async with db_engine.begin() as conn:
+        await conn.run_sync(_meta.create_all)
+    version = await current_version(db_engine)
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        async with db_engine.begin() as conn:
+            await conn.run_sync(apply)
+            await conn.run_sync(_set_version, number)
+        print(f"✅ Миграция {number}: {description}")
+        version = number
+    return version
+
+
+async def ensure_schema(db_engine: AsyncEngine = engine) -> None:
+    """Проверка при старте: версия схемы должна совпадать с HEAD."""
+    version = await current_version(db_engine)
+    if version == HEAD:
+        return
+    if version < HEAD and DB_AUTO_MIGRATE:
+        await upgrade(db_engine)
+        return
+    raise RuntimeError(
+        f"Версия схемы БД {version}, код ожидает {HEAD}. "
+        f"Запустите: python -m backend.app.migrations"
+    )
+
+
+if __name__ == "__main__":
+    async def _main() -> None:
+        version = await upgrade()
+        print(f"Схема БД на версии {version}")
+        await engine.dispose()
+
+    asyncio.run(_main())
@@ -1,11 +1,12 @@
 # backend/app/models.py
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, func, JSON, Boolean, UniqueConstraint, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, func, JSON, Boolean, UniqueConstraint, ForeignKey, Index
 from .db import Base
 from sqlalchemy.orm import Mapped, mapped_column
 from typing import List # Добавим импорт для аннотаций (опционально, если используем Pydantic)
 # backend/app/models.py
 from typing import Optional  # <-- добавить
+from datetime import datetime, timezone
 
 class User(Base):
     __tablename__ = "users"
@@ -25,7 +26,7 @@ class Profile(Base):
     __tablename__ = "profiles"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     name = Column(String(120), index=True)
     age = Column(Integer)
     city = Column(String(120), index=True)
@@ -37,6 +38,42 @@ class Profile(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index("uq_profiles_user_id", "user_id", unique=True),
+    )
+
+# --- Словарь токенов и токенизированные фасеты профиля ---
+class Token(Base):
+    __tablename__ = "tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(String(255), unique=True, nullable=False)
+
+class ProfileToken(Base):
+    __tablename__ = "profile_tokens"
+
+    # Нормализованные токены interests/skills/goals, считаются один раз при записи профиля
+    user_id = Column(Integer, primary_key=True)
+    facet = Column(String(16), primary_key=True)  # interests | skills | goals
+    token_id = Column(Integer, ForeignKey("tokens.id"), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_profile_tokens_facet_token", "facet", "token_id"),
+    )
+
+# --- Агрегат для аналитики: сколько профилей имеют токен (глобально и по городу) ---
+class FacetCount(Base):
+    __tablename__ = "facet_counts"
+
+    facet = Column(String(16), primary_key=True)
+    city = Column(String(120), primary_key=True)  # "" — по всем городам
+    token = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_facet_counts_top", "facet", "city", "count"),
+    )
+
 # --- Новая таблица для фотографий пользователей ---
 class UserPhoto(Base):
     __tablename__ = "user_photos"
@@ -48,11 +85,22 @@ class UserPhoto(Base):
     is_primary = Column(Boolean, default=False) # Флаг: основное фото
     upload_order = Column(Integer) # Порядок отображения (опционально)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Уменьшенные копии без метаданных (services/photo_variants.py); NULL — ещё не готовы
+    avatar_path = Column(String(500), nullable=True)
+    card_path = Column(String(500), nullable=True)
+    full_path = Column(String(500), nullable=True)
+    # Обработка копий: pending -> done | failed (с текстом ошибки); failed не перезапускается
+    variants_status = Column(String(16), nullable=False, server_default="pending")
+    variants_error = Column(String(500), nullable=True)
 
     # Уникальность upload_order для пользователя (опционально, если используется)
     # __table_args__ = (
     #     UniqueConstraint("user_id", "upload_order", name="uq_user_photo_order"),
     # )
+    __table_args__ = (
+        Index("ix_user_photos_user_primary_order", "user_id", "is_primary", "upload_order"),
+        Index("ix_user_photos_variants_status_id", "variants_status", "id"),
+    )
 
 # --- Лайки/дизлайки между пользователями ---
 class Like(Base):
@@ -66,6 +114,8 @@ class Like(Base):
 
     __table_args__ = (
         UniqueConstraint("from_user_id", "to_user_id", name="uq_like_from_to"),
+        # обратный лайк (to -> from) при свайпе — поиск по индексу
+        Index("ix_likes_to_from_like", "to_user_id", "from_user_id", "is_like"),
     )
 
 # --- Матч при взаимном лайке ---
@@ -89,9 +139,19 @@ class Conversation(Base):
     user1_id = Column(Integer, index=True, nullable=False)
     user2_id = Column(Integer, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Денормализация для инбокса: последнее сообщение и время активности
+    last_message_id = Column(Integer, nullable=True)
+    # Значение ставится из Python (UTC, с микросекундами), а не CURRENT_TIMESTAMP:
+    # у SQLite формат строки должен совпадать с параметрами keyset-курсора
+    last_activity_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Отметки прочтения участников: id последнего прочитанного сообщения
+    user1_last_read_id = Column(Integer, nullable=False, default=0, server_default="0")
+    user2_last_read_id = Column(Integer, nullable=False, default=0, server_default="0")
 
     __table_args__ = (
         UniqueConstraint("user1_id", "user2_id", name="uq_conversation_pair"),
+        Index("ix_conversations_user1_activity", "user1_id", "last_activity_at", "id"),
+        Index("ix_conversations_user2_activity", "user2_id", "last_activity_at", "id"),
     )
 
 class Message(Base):
@@ -103,6 +163,15 @@ class Message(Base):
     body = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+        # keyset-пагинация истории чата (before_id / after_id)
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+        # id только растут и не переиспользуются после удаления: на них завязаны
+        # отметки прочтения, last_message_id и догрузка after_id
+        {"sqlite_autoincrement": True},
+    )
+
 # --- Кэш/набор совпадений для одного пользователя ---
 class MatchSet(Base):
     __tablename__ = "match_sets"   # отдельная таблица, чтобы не конфликтовать с 'matches'
@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..db import get_async_session
 from ..models import User
-from ..security import hash_password, create_access_token, verify_password
+from ..security import hash_password_async, create_access_token, verify_password_async
 from ..schemas import UserCreate, Token, UserLogin
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -15,12 +15,12 @@ async def signup(payload: UserCreate, db: AsyncSession = Depends(get_async_sessi
     if res.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # создать пользователя
+    # создать пользователя (хеш считается в пуле потоков, не блокируя event loop)
     user = User(
         email=payload.email,
         name=payload.name,
         city=payload.city,
-        hashed_password=hash_password(payload.password),
+        hashed_password=await hash_password_async(payload.password),
     )
     db.add(user)
     await db.commit()
@@ -38,7 +38,7 @@ async def login_user(payload: UserLogin, # <-- ВАЖНО: для логина 
     user = result.scalar_one_or_none()
 
     # Проверить, существует ли пользователь и правильный ли пароль
-    if not user or not verify_password(payload.password, user.hashed_password): # <-- hashed_password, как в модели
+    if not user or not await verify_password_async(payload.password, user.hashed_password): # <-- hashed_password, как в модели
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
     # Создать токен
@@ -1,21 +1,30 @@
 # backend/app/routers/chat.py
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
-from ..db import get_async_session
-from ..security import get_current_user_id
+from sqlalchemy import select, update, and_, or_, case, func
+from sqlalchemy.exc import IntegrityError
+from ..db import IS_SQLITE, get_async_session, get_read_session
+from ..security import get_current_user_id, token_cache
 from ..models import Conversation, Message, Match
 from ..schemas import (
     ChatOpenRequest, ChatOpenResponse,
     ConversationsListResponse, ConversationOut,
-    MessageIn, MessageOut,
+    MessageIn, MessageOut, MessagesPage,
+    InboxResponse, ChatReadRequest, ChatReadResponse,
+    MessageSearchResponse,
 )
+from ..services.chat_hub import chat_hub
+from ..services import inbox, message_search
+from ..services.membership import conversation_members
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 @router.get("/conversations", response_model=ConversationsListResponse)
 async def list_conversations(current_user_id: int = Depends(get_current_user_id),
-                             db: AsyncSession = Depends(get_async_session)):
+                             db: AsyncSession = Depends(get_read_session)):
     res = await db.execute(
         select(Conversation).where(or_(Conversation.user1_id == current_user_id,
                                        Conversation.user2_id == current_user_id))
@@ -23,6 +32,37 @@ async def list_conversations(current_user_id: int = Depends(get_current_user_id)
     items = [ConversationOut.model_validate(c) for c in res.scalars().all()]
     return ConversationsListResponse(items=items)
 
+@router.get("/inbox", response_model=InboxResponse)
+async def list_inbox(cursor: Optional[str] = None,
+                     limit: int = Query(20, ge=1, le=100),
+                     current_user_id: int = Depends(get_current_user_id),
+                     db: AsyncSession = Depends(get_read_session)):
+    """Чаты по последней активности: собеседник, превью последнего сообщения, непрочитанные."""
+    after = None
+    if cursor:
+        after = inbox.decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Некорректный cursor")
+    items, next_cursor = await inbox.load_inbox(db, current_user_id, after, limit)
+    return InboxResponse(items=items, next_cursor=next_cursor)
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(q: str = Query(..., min_length=1, max_length=200),
+                          cursor: Optional[str] = None,
+                          limit: int = Query(20, ge=1, le=100),
+                          current_user_id: int = Depends(get_current_user_id),
+                          db: AsyncSession = Depends(get_read_session)):
+    """Поиск по сообщениям своих бесед (FTS5, ранжирование bm25)."""
+    if not IS_SQLITE:
+        raise HTTPException(status_code=501, detail="Поиск по сообщениям доступен только на SQLite (FTS5)")
+    after = None
+    if cursor:
+        after = message_search.decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Некорректный cursor")
+    items, next_cursor = await message_search.search_messages(db, current_user_id, q, after, limit)
+    return MessageSearchResponse(items=items, next_cursor=next_cursor)
+
 @router.post("/open", response_model=ChatOpenResponse)
 async def open_chat(payload: ChatOpenRequest,
                     current_user_id: int = Depends(get_current_user_id),
@@ -34,58 +74,127 @@ async def open_chat(payload: ChatOpenRequest,
     u1 = min(current_user_id, target_id)
     u2 = max(current_user_id, target_id)
 
+    # Беседа уже известна — матч был проверен при её создании
+    conversation_id = conversation_members.get_by_pair(u1, u2)
+    if conversation_id is not None:
+        return ChatOpenResponse(conversation_id=conversation_id)
+
     # Проверяем, что есть матч между пользователями
-    match_res = await db.execute(select(Match).where(and_(Match.user1_id == u1, Match.user2_id == u2)))
+    match_res = await db.execute(select(Match.id).where(and_(Match.user1_id == u1, Match.user2_id == u2)))
     if match_res.scalar_one_or_none() is None:
         raise HTTPException(status_code=403, detail="Чат доступен только при взаимном лайке")
 
     # Ищем существующий разговор или создаём новый
-    conv_res = await db.execute(select(Conversation).where(and_(Conversation.user1_id == u1,
-                                                                Conversation.user2_id == u2)))
-    conv = conv_res.scalar_one_or_none()
-    if conv is None:
+    find = select(Conversation.id).where(and_(Conversation.user1_id == u1, Conversation.user2_id == u2))
+    conversation_id = (await db.execute(find)).scalar_one_or_none()
+    if conversation_id is None:
         conv = Conversation(user1_id=u1, user2_id=u2)
         db.add(conv)
-        await db.commit()
-        await db.refresh(conv)
+        try:
+            await db.commit()
+            conversation_id = conv.id
+        except IntegrityError:
+            # Параллельный open_chat успел создать беседу (uq_conversation_pair)
+            await db.rollback()
+            conversation_id = (await db.execute(find)).scalar_one()
 
-    # Дополнительно проверим, что текущий пользователь участник беседы
-    if current_user_id not in (conv.user1_id, conv.user2_id):
-        raise HTTPException(status_code=403, detail="Нет доступа к чату")
+    conversation_members.put(conversation_id, u1, u2)
+    return ChatOpenResponse(conversation_id=conversation_id)
 
-    return ChatOpenResponse(conversation_id=conv.id)
+def _read_marker_column(user1_id: int, user_id: int):
+    return Conversation.user1_last_read_id if user1_id == user_id else Conversation.user2_last_read_id
 
-async def _ensure_participant(db: AsyncSession, conversation_id: int, user_id: int) -> Conversation:
-    conv_res = await db.execute(select(Conversation).where(Conversation.id == conversation_id))
-    conv = conv_res.scalar_one_or_none()
-    if conv is None:
-        raise HTTPException(status_code=404, detail="Чат не найден")
-    if user_id not in (conv.user1_id, conv.user2_id):
+async def _ensure_participant(db: AsyncSession, conversation_id: int, user_id: int) -> Tuple[int, int]:
+    """Участники беседы (user1_id, user2_id); из кэша, а при промахе — одним чтением из БД."""
+    pair = conversation_members.get(conversation_id)
+    if pair is None:
+        res = await db.execute(
+            select(Conversation.user1_id, Conversation.user2_id).where(Conversation.id == conversation_id)
+        )
+        row = res.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Чат не найден")
+        pair = (row.user1_id, row.user2_id)
+        conversation_members.put(conversation_id, *pair)
+    if user_id not in pair:
         raise HTTPException(status_code=403, detail="Нет доступа к чату")
-    return conv
+    return pair
 
-@router.get("/{conversation_id}/messages", response_model=list[MessageOut])
+@router.get("/{conversation_id}/messages", response_model=MessagesPage)
 async def list_messages(conversation_id: int,
+                        before_id: Optional[int] = Query(None, ge=1),
+                        after_id: Optional[int] = Query(None, ge=1),
+                        limit: int = Query(50, ge=1, le=200),
                         current_user_id: int = Depends(get_current_user_id),
-                        db: AsyncSession = Depends(get_async_session)):
+                        db: AsyncSession = Depends(get_read_session)):
+    """
+    Keyset-пагинация по (conversation_id, id):
+    без курсора — последние `limit` сообщений; before_id — более старые;
+    after_id — более новые (догрузка после последнего известного).
+    after_id корректен, потому что id сообщений не переиспользуются
+    (AUTOINCREMENT, миграция 7); удаления он не показывает.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=422, detail="Укажите только before_id или after_id")
     await _ensure_participant(db, conversation_id, current_user_id)
-    res = await db.execute(select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at.asc()))
-    return [MessageOut.model_validate(m) for m in res.scalars().all()]
+
+    # Только нужные колонки, без ORM-объектов; limit + 1 — есть ли следующая страница
+    stmt = select(Message.id, Message.conversation_id, Message.sender_id, Message.body) \
+        .where(Message.conversation_id == conversation_id)
+    if after_id is not None:
+        stmt = stmt.where(Message.id > after_id).order_by(Message.id.asc())
+    else:
+        if before_id is not None:
+            stmt = stmt.where(Message.id < before_id)
+        stmt = stmt.order_by(Message.id.desc())
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is None:
+        rows.reverse()
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = rows[-1].id if after_id is not None else rows[0].id
+    return MessagesPage(
+        items=[MessageOut.model_validate(r._mapping) for r in rows],
+        next_cursor=next_cursor,
+    )
 
 @router.post("/{conversation_id}/messages", response_model=MessageOut)
 async def send_message(conversation_id: int, payload: MessageIn,
                        current_user_id: int = Depends(get_current_user_id),
                        db: AsyncSession = Depends(get_async_session)):
-    await _ensure_participant(db, conversation_id, current_user_id)
+    members = await _ensure_participant(db, conversation_id, current_user_id)
     if not payload.body or not payload.body.strip():
         raise HTTPException(status_code=422, detail="Текст сообщения пуст")
     msg = Message(conversation_id=conversation_id, sender_id=current_user_id, body=payload.body.strip())
     db.add(msg)
+    await db.flush()
+    # Инбокс: последнее сообщение и активность; своё сообщение отправитель уже прочитал.
+    # max() через CASE — параллельная отправка не откатит значения назад
+    marker = _read_marker_column(members[0], current_user_id)
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values({
+            Conversation.last_message_id: case(
+                (func.coalesce(Conversation.last_message_id, 0) < msg.id, msg.id),
+                else_=Conversation.last_message_id,
+            ),
+            Conversation.last_activity_at: datetime.now(timezone.utc),
+            marker: case((marker < msg.id, msg.id), else_=marker),
+        })
+    )
     await db.commit()
-    await db.refresh(msg)
-    return MessageOut.model_validate(msg)
+    out = MessageOut.model_validate(msg)
+    # Рассылаем только после commit — подписчики не увидят несохранённое сообщение
+    await chat_hub.publish(members, {"type": "message", "message": out.model_dump()})
+    return out
+
 @router.delete("/{conversation_id}/messages/{message_id}", response_model=MessageOut)
 async def delete_message(conversation_id: int, message_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_session)):
+    members = await _ensure_participant(db, conversation_id, current_user_id)
     msg = await db.execute(select(Message).where(Message.id == message_id, Message.conversation_id == conversation_id))
     msg = msg.scalar_one_or_none()
     if not msg:
@@ -93,5 +202,81 @@ async def delete_message(conversation_id: int, message_id: int, current_user_id:
     if msg.sender_id != current_user_id:
         raise HTTPException(status_code=403, detail="You can't delete this message")
     await db.delete(msg)
+    # Если удалили последнее сообщение — в инбоксе показываем предыдущее
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id, Conversation.last_message_id == message_id)
+        .values(last_message_id=select(func.max(Message.id))
+                .where(Message.conversation_id == conversation_id)
+                .scalar_subquery())
+    )
     await db.commit()
+    await chat_hub.publish(
+        members,
+        {"type": "message_deleted", "conversation_id": conversation_id, "id": message_id},
+    )
     return MessageOut.model_validate(msg)
+
+@router.post("/{conversation_id}/read", response_model=ChatReadResponse)
+async def mark_read(conversation_id: int, payload: ChatReadRequest,
+                    current_user_id: int = Depends(get_current_user_id),
+                    db: AsyncSession = Depends(get_async_session)):
+    """Сдвигает отметку прочтения (только вперёд) до message_id или до последнего сообщения."""
+    members = await _ensure_participant(db, conversation_id, current_user_id)
+    marker = _read_marker_column(members[0], current_user_id)
+    last_id = func.coalesce(Conversation.last_message_id, 0)
+    target = last_id if payload.message_id is None else case(
+        (last_id < payload.message_id, last_id), else_=payload.message_id,
+    )
+    # Одно UPDATE ... RETURNING: без предварительного чтения беседы
+    res = await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values({marker: case((marker < target, target), else_=marker)})
+        .returning(marker)
+    )
+    last_read_id = res.scalar_one()
+    await db.commit()
+    await chat_hub.publish(
+        members,
+        {"type": "read", "conversation_id": conversation_id, "user_id": current_user_id,
+         "last_read_id": last_read_id},
+    )
+    return ChatReadResponse(conversation_id=conversation_id, last_read_id=last_read_id)
+
+@router.websocket("/ws")
+async def chat_ws(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Поток событий чатов текущего пользователя: message, message_deleted, read, resync.
+    JWT передаётся в ?token= (браузерный WebSocket не умеет заголовки) или в Authorization.
+    """
+    if token is None:
+        auth = websocket.headers.get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            token = auth[7:]
+    try:
+        user_id = token_cache.resolve(token or "")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = chat_hub.subscribe(user_id)
+
+    async def pump():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def drain():
+        # Входящие кадры (например, ping клиента) не нужны — ждём отключения
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        chat_hub.unsubscribe(user_id, queue)
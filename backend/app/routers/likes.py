@@ -1,13 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from ..db import get_async_session
+from sqlalchemy import select, and_, func, literal
+from ..db import DIALECT, dialect_insert, get_async_session, get_read_session
 from ..security import get_current_user_id
-from ..schemas import SwipeRequest, SwipeResponse, MatchesResponse
+from ..schemas import SwipeRequest, SwipeResponse, SwipeBatchRequest, SwipeBatchResponse, MatchesResponse
 from ..models import Like, Match
+from ..services.seen import seen_sets
+from ..services.ml import ml_results
 
 router = APIRouter(prefix="/swipe", tags=["swipe"])
 
+async def _upsert_likes(db: AsyncSession, from_user_id: int, actions: dict[int, bool]) -> None:
+    """Многострочный upsert свайпов from_user_id: {to_user_id: is_like} (без commit)."""
+    stmt = dialect_insert(Like).values([
+        {"from_user_id": from_user_id, "to_user_id": to_user_id, "is_like": is_like}
+        for to_user_id, is_like in actions.items()
+    ])
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Like.from_user_id, Like.to_user_id],
+            set_={"is_like": stmt.excluded.is_like},
+        )
+    )
+
+async def _lock_pairs(db: AsyncSession, user_id: int, target_ids) -> None:
+    """
+    PostgreSQL (READ COMMITTED): два встречных лайка в параллельных транзакциях
+    не видят друг друга, и матч не создаёт ни одна. Advisory-лок на пару
+    сериализует их до commit. Порядок взятия — по паре, чтобы не было дедлоков.
+    SQLite и так сериализует пишущие транзакции.
+    """
+    if DIALECT != "postgresql":
+        return
+    for pair in sorted((min(user_id, t), max(user_id, t)) for t in target_ids):
+        await db.execute(select(func.pg_advisory_xact_lock(*pair)))
+
 @router.post("/", response_model=SwipeResponse)
 async def swipe(payload: SwipeRequest,
                 current_user_id: int = Depends(get_current_user_id),
@@ -16,48 +43,90 @@ async def swipe(payload: SwipeRequest,
         raise HTTPException(status_code=400, detail="Нельзя лайкать собственную анкету")
 
     is_like = payload.action == "like"
+    target_id = payload.target_user_id
 
-    # Найдём существующий свайп и обновим или создадим новый
-    res = await db.execute(
-        select(Like).where(and_(Like.from_user_id == current_user_id,
-                                 Like.to_user_id == payload.target_user_id))
-    )
-    like_obj = res.scalar_one_or_none()
-    if like_obj:
-        like_obj.is_like = is_like
-    else:
-        like_obj = Like(from_user_id=current_user_id, to_user_id=payload.target_user_id, is_like=is_like)
-        db.add(like_obj)
-    await db.commit()
+    if is_like:
+        await _lock_pairs(db, current_user_id, [target_id])
+    # Один upsert по uq_like_from_to вместо select + insert/update
+    await _upsert_likes(db, current_user_id, {target_id: is_like})
 
     matched = False
     if is_like:
-        # Проверяем взаимный лайк
-        res_back = await db.execute(
-            select(Like).where(and_(Like.from_user_id == payload.target_user_id,
-                                     Like.to_user_id == current_user_id,
-                                     Like.is_like == True))
+        # Взаимный лайк: проверка и создание матча в той же транзакции.
+        # uq_match_pair + ON CONFLICT DO NOTHING гарантируют ровно один Match на пару.
+        back_like = (
+            select(Like.id)
+            .where(and_(Like.from_user_id == target_id,
+                        Like.to_user_id == current_user_id,
+                        Like.is_like == True))
+            .exists()
         )
-        back_like = res_back.scalar_one_or_none()
-        if back_like:
-            # Создаём матч, если его ещё нет
-            user1 = min(current_user_id, payload.target_user_id)
-            user2 = max(current_user_id, payload.target_user_id)
-            res_match = await db.execute(
-                select(Match).where(and_(Match.user1_id == user1, Match.user2_id == user2))
+        user1 = min(current_user_id, target_id)
+        user2 = max(current_user_id, target_id)
+        await db.execute(
+            dialect_insert(Match)
+            .from_select(
+                [Match.user1_id, Match.user2_id],
+                select(literal(user1), literal(user2)).where(back_like),
             )
-            match_obj = res_match.scalar_one_or_none()
-            if not match_obj:
-                db.add(Match(user1_id=user1, user2_id=user2))
-                await db.commit()
-            matched = True
+            .on_conflict_do_nothing(index_elements=[Match.user1_id, Match.user2_id])
+        )
+        matched = bool((await db.execute(select(back_like))).scalar())
+    ml_results.invalidate(current_user_id)
+    await db.commit()
+    seen_sets.add(current_user_id, [target_id])
 
     return SwipeResponse(action=payload.action, match=matched)
 
 
+@router.post("/batch", response_model=SwipeBatchResponse)
+async def swipe_batch(payload: SwipeBatchRequest,
+                      current_user_id: int = Depends(get_current_user_id),
+                      db: AsyncSession = Depends(get_async_session)):
+    """Применяет очередь свайпов клиента одной транзакцией."""
+    if any(item.target_user_id == current_user_id for item in payload.items):
+        raise HTTPException(status_code=400, detail="Нельзя лайкать собственную анкету")
+    if not payload.items:
+        return SwipeBatchResponse(items=[])
+
+    # Итоговое действие по каждой анкете — последнее в очереди
+    final = {item.target_user_id: item.action == "like" for item in payload.items}
+    liked = {target_id for target_id, is_like in final.items() if is_like}
+    await _lock_pairs(db, current_user_id, liked)
+    await _upsert_likes(db, current_user_id, final)
+
+    # Взаимные лайки одним запросом и матчи одним многострочным insert
+    back_ids: set[int] = set()
+    if liked:
+        res_back = await db.execute(
+            select(Like.from_user_id).where(and_(Like.to_user_id == current_user_id,
+                                                 Like.from_user_id.in_(liked),
+                                                 Like.is_like == True))
+        )
+        back_ids = set(res_back.scalars().all())
+    if back_ids:
+        await db.execute(
+            dialect_insert(Match)
+            .values([
+                {"user1_id": min(current_user_id, uid), "user2_id": max(current_user_id, uid)}
+                for uid in back_ids
+            ])
+            .on_conflict_do_nothing(index_elements=[Match.user1_id, Match.user2_id])
+        )
+    ml_results.invalidate(current_user_id)
+    await db.commit()
+    seen_sets.add(current_user_id, final)
+
+    # match — по итоговому состоянию анкеты, а не по отдельному элементу очереди
+    return SwipeBatchResponse(items=[
+        SwipeResponse(action=item.action, match=item.target_user_id in back_ids)
+        for item in payload.items
+    ])
+
+
 @router.get("/matches", response_model=MatchesResponse)
 async def list_matches(current_user_id: int = Depends(get_current_user_id),
-                       db: AsyncSession = Depends(get_async_session)):
+                       db: AsyncSession = Depends(get_read_session)):
     res = await db.execute(
         select(Match).where((Match.user1_id == current_user_id) | (Match.user2_id == current_user_id))
     )
@@ -6,6 +6,7 @@ import aiofiles
 from ..db import get_async_session
 from ..models import UserPhoto
 from ..security import get_current_user_id
+from ..services.photo_variants import photo_pipeline
 import uuid
 from pathlib import Path
 
@@ -46,6 +47,8 @@ async def upload_photo(
         db.add(db_photo)
         await db.commit()
         await db.refresh(db_photo)
+        # Уменьшенные копии (avatar/card/full) готовятся в фоне, в пуле процессов
+        photo_pipeline.submit(db_photo.id, str(file_path.as_posix()))
         return {
             "id": db_photo.id,
             "photo_path": str(db_photo.photo_path),
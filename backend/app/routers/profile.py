@@ -2,11 +2,18 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, insert, delete
-from ..db import get_async_session
+from sqlalchemy import select, update, delete
+from ..db import dialect_insert, get_async_session, get_read_session
 from ..models import Profile, UserPhoto
 from ..security import get_current_user_id
-from pathlib import Path
+from ..services.profile_index import profile_index
+from ..services.profile_tokens import EMPTY_FACETS, facets_of, store_facets
+from ..services import facet_counts, match_sets
+from ..services.feed import feed_snapshots
+from ..services.photo_variants import remove_files
+from ..services.ml import ml_results
+from ..services.precompute import precompute_worker, PRIORITY_PROFILE_CHANGED
+from . import analytics
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
@@ -26,8 +33,10 @@ async def get_profile(
     res = await db.execute(select(Profile).where(Profile.user_id == user_id))
     prof = res.scalar_one_or_none()
     if not prof:
+        # Параллельные первые GET /profile: uq_profiles_user_id + ON CONFLICT DO NOTHING,
+        # проигравший запрос просто перечитывает профиль, созданный победителем
         row = await db.execute(
-            insert(Profile).values(
+            dialect_insert(Profile).values(
                 user_id=user_id,
                 name="",
                 age=None,
@@ -36,12 +45,17 @@ async def get_profile(
                 interests="",
                 skills="",
                 goals="",
-            ).returning(Profile.id)
+            )
+            .on_conflict_do_nothing(index_elements=[Profile.user_id])
+            .returning(Profile.id)
         )
+        # RETURNING читаем до commit: так работает и на SQLite, и на asyncpg
+        created = row.scalar_one_or_none() is not None
         await db.commit()
-        prof_id = row.scalar_one()
-        res = await db.execute(select(Profile).where(Profile.id == prof_id))
+        res = await db.execute(select(Profile).where(Profile.user_id == user_id))
         prof = res.scalar_one()
+        if created:
+            profile_index.upsert(user_id, EMPTY_FACETS)
 
     return {
         "id": prof.id,
@@ -75,15 +89,29 @@ async def update_profile(
             fields[key] = val
 
     if fields:
+        current = {key: getattr(prof, key) for key in ["interests", "skills", "goals"]}
+        current.update({k: v for k, v in fields.items() if k in current})
+        facets = facets_of(current["interests"], current["skills"], current["goals"])
+        old_city = prof.city
+        new_city = fields.get("city", old_city)
         await db.execute(update(Profile).where(Profile.user_id == user_id).values(**fields))
+        old_facets = await store_facets(db, user_id, facets)
+        await facet_counts.apply_change(db, old_city, old_facets, new_city, facets)
+        # Набор, посчитанный по старому профилю, больше не годится
+        ml_results.invalidate(user_id)
+        await match_sets.invalidate(db, user_id)
         await db.commit()
+        profile_index.upsert(user_id, facets)
+        feed_snapshots.drop(user_id)
+        precompute_worker.enqueue(user_id, PRIORITY_PROFILE_CHANGED)
+        await analytics.invalidate_cache()
 
     return {"ok": True, "updated": list(fields.keys())}
 
 # ---------- Фото ----------
 @router.get("/photos")
 async def list_photos(
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user_id: int = Depends(get_current_user_id),
 ):
     res = await db.execute(select(UserPhoto).where(UserPhoto.user_id == current_user_id))
@@ -92,8 +120,11 @@ async def list_photos(
         "items": [
             {
                 "id": p.id,
-                "photo_path": str(p.photo_path),
+                "photo_path": str(p.full_path or p.photo_path),
+                "avatar_path": p.avatar_path or str(p.photo_path),
+                "card_path": p.card_path or str(p.photo_path),
                 "is_primary": bool(getattr(p, "is_primary", False)),
+                "variants_status": p.variants_status,
             }
             for p in photos
         ]
@@ -137,13 +168,8 @@ async def delete_photo(
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
 
-    # удалить файл с диска (если есть)
-    try:
-        p = Path(str(photo.photo_path))
-        if p.exists():
-            p.unlink(missing_ok=True)
-    except Exception as e:
-        print(f"⚠️ Не удалось удалить файл {photo.photo_path}: {e}")
+    # удалить файл и его уменьшенные копии с диска (если есть)
+    remove_files([photo.photo_path, photo.avatar_path, photo.card_path, photo.full_path])
 
     await db.execute(delete(UserPhoto).where(UserPhoto.id == photo_id))
     await db.commit()
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ..db import get_async_session
+from ..db import get_read_session
 from ..security import get_current_user_id
 from ..models import User
 from ..schemas import UserRead
@@ -13,7 +13,7 @@ def ping():
     return {"users": "pong"}
 
 @router.get("/me", response_model=UserRead)
-async def me(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_session)):
+async def me(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_read_session)):
     res = await db.execute(select(User).where(User.id == current_user_id))
     user = res.scalar_one_or_none()
     if not user:
@@ -21,7 +21,7 @@ async def me(current_user_id: int = Depends(get_current_user_id), db: AsyncSessi
     return user
 
 @router.get("/{user_id}", response_model=UserRead)
-async def get_user(user_id: int, db: AsyncSession = Depends(get_async_session)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_session)):
     res = await db.execute(select(User).where(User.id == user_id))
     user = res.scalar_one_or_none()
     if not user:
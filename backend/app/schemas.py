@@ -1,6 +1,6 @@
 # backend/app/schemas.py
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Literal
 from datetime import datetime
 
@@ -105,6 +105,13 @@ class SwipeResponse(BaseModel):
     action: str
     match: bool = False
 
+class SwipeBatchRequest(BaseModel):
+    # Свайпы применяются по порядку; для одной анкеты побеждает последний
+    items: List[SwipeRequest] = Field(default_factory=list, max_length=100)
+
+class SwipeBatchResponse(BaseModel):
+    items: List[SwipeResponse]
+
 class MatchesResponse(BaseModel):
     user_ids: List[int]
 
@@ -137,3 +144,44 @@ class MessageOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+class MessagesPage(BaseModel):
+    # Сообщения по возрастанию id; next_cursor — для следующего запроса
+    # в том же направлении (before_id при листании назад, after_id — вперёд)
+    items: List[MessageOut]
+    next_cursor: Optional[int] = None
+
+class InboxPartner(BaseModel):
+    id: int
+    name: str
+    photo_path: Optional[str] = None
+
+class InboxLastMessage(BaseModel):
+    id: int
+    sender_id: int
+    preview: str
+    created_at: Optional[datetime] = None
+
+class InboxItem(BaseModel):
+    conversation_id: int
+    partner: InboxPartner
+    last_message: Optional[InboxLastMessage] = None
+    last_activity_at: Optional[datetime] = None
+    unread_count: int
+
+class InboxResponse(BaseModel):
+    items: List[InboxItem]
+    next_cursor: Optional[str] = None
+
+class ChatReadRequest(BaseModel):
+    # Без message_id — прочитано всё до последнего сообщения
+    message_id: Optional[int] = None
+
+class ChatReadResponse(BaseModel):
+    conversation_id: int
+    last_read_id: int
+
+class MessageSearchResponse(BaseModel):
+    # По релевантности (bm25), лучшие первыми
+    items: List[MessageOut]
+    next_cursor: Optional[str] = None
@@ -3,8 +3,14 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
-from fastapi import HTTPException, Security
+from fastapi import HTTPException, Request, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+import asyncio
+import threading
+import time
 import os
 
 # Settings
@@ -12,6 +18,13 @@ SECRET_KEY = os.getenv("SECRET_KEY", "change_me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Хеширование паролей — в отдельном пуле, чтобы не блокировать event loop
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+
+# Сколько проверенных токенов держать в памяти
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 security = HTTPBearer()
 
@@ -21,6 +34,71 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
+class HashPool:
+    """
+    Ограниченный пул потоков для pbkdf2 (hashlib отпускает GIL на время хеширования).
+    Если в работе и в очереди уже workers + queue_limit задач, новые получают 503.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.counters = {"calls": 0, "rejected": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _record_wait(self, wait_s: float) -> None:
+        wait_ms = wait_s * 1000.0
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["wait_ms_total"] += wait_ms
+            self.counters["wait_ms_max"] = max(self.counters["wait_ms_max"], wait_ms)
+
+    async def run(self, fn, *args):
+        if self.pending >= self.workers + self.queue_limit:
+            self.counters["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Сервер перегружен, попробуйте позже",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwd-hash")
+        submitted = time.monotonic()
+
+        def job():
+            self._record_wait(time.monotonic() - submitted)
+            return fn(*args)
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        calls = self.counters["calls"]
+        return {
+            "pending": self.pending,
+            "wait_ms_avg": round(self.counters["wait_ms_total"] / calls, 2) if calls else 0.0,
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in self.counters.items()},
+        }
+
+
+hash_pool = HashPool()
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(hash_password, password)
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    return await hash_pool.run(verify_password, password, password_hash)
+
 def create_access_token(payload: dict, minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     to_encode = payload.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=minutes)
@@ -28,13 +106,58 @@ def create_access_token(payload: dict, minutes: int = ACCESS_TOKEN_EXPIRE_MINUTE
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)) -> int:
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
+class TokenCache:
+    """
+    LRU проверенных JWT: token -> (user_id, exp). Подпись проверяется один раз,
+    дальше токен живёт в кэше до своего exp. Невалидные токены не кэшируются.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0}
+
+    def resolve(self, token: str) -> int:
+        entry = self._entries.get(token)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._entries.move_to_end(token)
+                self.counters["hits"] += 1
+                return entry[0]
+            del self._entries[token]
+            self.counters["expired"] += 1
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+        self.counters["misses"] += 1
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Could not validate credentials")
+            user_id = int(user_id)
+        except (JWTError, ValueError):
             raise HTTPException(status_code=401, detail="Could not validate credentials")
-        return int(user_id)
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+        exp = payload.get("exp")
+        if exp is not None:
+            self._entries[token] = (user_id, float(exp))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return user_id
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), **self.counters}
+
+
+token_cache = TokenCache()
+
+async def get_current_user_id(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Security(security),
+) -> int:
+    # Один раз за запрос: результат делят все зависимости (в т.ч. router-level)
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is None:
+        user_id = token_cache.resolve(credentials.credentials)
+        request.state.user_id = user_id
+    return user_id
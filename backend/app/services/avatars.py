@@ -0,0 +1,47 @@
+# backend/app/services/avatars.py
+
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import UserPhoto
+from .photo_variants import photo_url_column
+
+
+async def primary_photo_paths(
+    db: AsyncSession,
+    user_ids: Iterable[int],
+    size: str = "card",
+) -> Dict[int, Optional[str]]:
+    """
+    Возвращает основное фото для каждого из user_ids одним запросом.
+    size — avatar | card | full; пока копия не готова, отдаётся оригинал.
+
+    Порядок выбора тот же, что и раньше: is_primary, затем upload_order,
+    затем самое свежее. Первая строка на пользователя выбирается оконной
+    функцией на стороне БД, так что наружу уходит не больше одной строки
+    на user_id. Вызывать стоит уже для финальной страницы выдачи.
+    """
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+
+    ranked = (
+        select(
+            UserPhoto.user_id.label("user_id"),
+            photo_url_column(size).label("photo_path"),
+            func.row_number().over(
+                partition_by=UserPhoto.user_id,
+                order_by=(
+                    UserPhoto.is_primary.desc(),
+                    func.coalesce(UserPhoto.upload_order, 999999).asc(),
+                    UserPhoto.uploaded_at.desc(),
+                ),
+            ).label("rn"),
+        )
+        .where(UserPhoto.user_id.in_(ids))
+        .subquery()
+    )
+    res = await db.execute(select(ranked.c.user_id, ranked.c.photo_path).where(ranked.c.rn == 1))
+    return {uid: path for uid, path in res.all()}
@@ -0,0 +1,165 @@
+# backend/app/services/cache.py
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except Exception:  # pragma: no cover
+    aioredis = None  # type: ignore
+
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+# (value, fresh_until, stale_until) — время по time.time()
+Entry = Tuple[Any, float, float]
+
+
+class MemoryBackend:
+    """LRU в памяти процесса с TTL."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Entry]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Entry]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: Entry) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def mark_stale(self, key: str) -> None:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data[key] = (entry[0], 0.0, entry[2])
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisBackend:
+    """Redis-совместимое хранилище; значения — JSON, срок жизни — stale_until."""
+
+    def __init__(self, url: str, prefix: str = "titanit:cache:") -> None:
+        self.client = aioredis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Entry]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        value, fresh_until, stale_until = json.loads(raw)
+        return value, fresh_until, stale_until
+
+    async def set(self, key: str, entry: Entry) -> None:
+        ttl = max(1, int(entry[2] - time.time()))
+        await self.client.set(self.prefix + key, json.dumps(list(entry)), ex=ttl)
+
+    async def mark_stale(self, key: str) -> None:
+        # Разные процессы держат свои копии — проще удалить, чем переписывать
+        await self.client.delete(self.prefix + key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class ResponseCache:
+    """
+    Кэш ответов с TTL и stale-while-revalidate.
+
+    Свежее значение отдаётся сразу. Устаревшее (но ещё в пределах stale_ttl)
+    тоже отдаётся сразу, а пересчёт запускается один раз в фоне.
+    При промахе одновременные запросы по одному ключу ждут общий пересчёт.
+    """
+
+    def __init__(self, backend=None) -> None:
+        self.backend = backend or MemoryBackend()
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0.0,
+    ) -> Any:
+        now = time.time()
+        entry = await self.backend.get(key)
+        if entry is not None:
+            value, fresh_until, _ = entry
+            if fresh_until > now:
+                self.counters["hits"] += 1
+                return value
+            self.counters["stale_hits"] += 1
+            self._refresh(key, compute, ttl, stale_ttl)
+            return value
+
+        self.counters["misses"] += 1
+        # shield: отмена одного ожидающего запроса не должна отменять общий пересчёт
+        return await asyncio.shield(self._refresh(key, compute, ttl, stale_ttl))
+
+    def _refresh(self, key, compute, ttl, stale_ttl) -> "asyncio.Task[Any]":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute, ttl, stale_ttl))
+            # ошибки фонового пересчёта уже посчитаны в counters["errors"]
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _compute(self, key, compute, ttl, stale_ttl) -> Any:
+        self.counters["refreshes"] += 1
+        try:
+            value = await compute()
+            now = time.time()
+            await self.backend.set(key, (value, now + ttl, now + ttl + stale_ttl))
+            return value
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def invalidate(self, *keys: str) -> None:
+        """Помечает ключи устаревшими: следующий запрос получит старое значение и запустит пересчёт."""
+        for key in keys:
+            await self.backend.mark_stale(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "inflight": len(self._inflight),
+            **self.counters,
+        }
+
+    async def close(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self.backend.close()
+
+
+def _make_backend():
+    if not CACHE_URL:
+        return MemoryBackend()
+    if aioredis is None:
+        # Без общего кэша воркеры отдавали бы разные ответы и по-разному их сбрасывали
+        raise RuntimeError("CACHE_URL задан, но пакет redis не установлен: pip install redis")
+    return RedisBackend(CACHE_URL)
+
+
+response_cache = ResponseCache(_make_backend())
@@ -0,0 +1,137 @@
+# backend/app/services/chat_hub.py
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except Exception:  # pragma: no cover
+    aioredis = None  # type: ignore
+
+# redis://... — общий брокер, если запущено несколько воркеров uvicorn
+CHAT_HUB_URL = os.getenv("CHAT_HUB_URL", "")
+CHAT_HUB_CHANNEL = os.getenv("CHAT_HUB_CHANNEL", "titanit:chat")
+# Сколько событий ждут отправки в одно подключение, прежде чем оно считается отставшим
+CHAT_WS_QUEUE_MAX = int(os.getenv("CHAT_WS_QUEUE_MAX", "100"))
+
+# Отставшему подключению вместо потерянных событий приходит одно это.
+# Потерянными могли быть и удаления, и отметки прочтения, поэтому клиент
+# перечитывает инбокс (GET /chat/inbox) и последнюю страницу открытых бесед
+# (GET /chat/{id}/messages без курсора), а не только догружает after_id
+RESYNC_EVENT = {"type": "resync"}
+
+
+class LocalHub:
+    """
+    Pub/sub в памяти процесса: user_id -> очереди его WebSocket-подключений.
+    Подходит для одного воркера; для нескольких — RedisHub.
+    """
+
+    def __init__(self, queue_max: int = CHAT_WS_QUEUE_MAX) -> None:
+        self.queue_max = queue_max
+        self._subs: Dict[int, Set["asyncio.Queue[Dict[str, Any]]"]] = {}
+        self.counters = {"published": 0, "delivered": 0, "resyncs": 0}
+
+    def subscribe(self, user_id: int) -> "asyncio.Queue[Dict[str, Any]]":
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=self.queue_max)
+        self._subs.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        queues = self._subs.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subs[user_id]
+
+    async def publish(self, user_ids: Iterable[int], event: Dict[str, Any]) -> None:
+        self.counters["published"] += 1
+        self.deliver(user_ids, event)
+
+    def deliver(self, user_ids: Iterable[int], event: Dict[str, Any]) -> None:
+        """Раздаёт событие локальным подключениям указанных пользователей."""
+        for user_id in set(user_ids):
+            for queue in self._subs.get(user_id, ()):
+                try:
+                    queue.put_nowait(event)
+                    self.counters["delivered"] += 1
+                except asyncio.QueueFull:
+                    # Медленный клиент: сбрасываем очередь и просим догрузить историю
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC_EVENT)
+                    self.counters["resyncs"] += 1
+
+    async def start(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        self._subs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "users": len(self._subs),
+            "connections": sum(len(q) for q in self._subs.values()),
+            **self.counters,
+        }
+
+
+class RedisHub(LocalHub):
+    """
+    Redis-совместимый брокер: publish уходит в общий канал, а фоновый
+    слушатель каждого воркера раздаёт события своим подключениям.
+    """
+
+    def __init__(self, url: str, channel: str = CHAT_HUB_CHANNEL, queue_max: int = CHAT_WS_QUEUE_MAX) -> None:
+        super().__init__(queue_max)
+        self.client = aioredis.from_url(url)
+        self.channel = channel
+        self._listener: Optional["asyncio.Task[None]"] = None
+
+    async def publish(self, user_ids: Iterable[int], event: Dict[str, Any]) -> None:
+        self.counters["published"] += 1
+        await self.client.publish(self.channel, json.dumps({"user_ids": list(user_ids), "event": event}))
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for raw in pubsub.listen():
+                if raw.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(raw["data"])
+                    self.deliver(data["user_ids"], data["event"])
+                except Exception as e:
+                    print(f"⚠️ Некорректное событие чата из брокера: {e}")
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await super().close()
+        await self.client.aclose()
+
+
+def _make_hub() -> LocalHub:
+    if not CHAT_HUB_URL:
+        return LocalHub()
+    if aioredis is None:
+        # Тихий откат на LocalHub при нескольких воркерах терял бы сообщения
+        # собеседникам, подключённым к другому воркеру
+        raise RuntimeError("CHAT_HUB_URL задан, но пакет redis не установлен: pip install redis")
+    return RedisHub(CHAT_HUB_URL)
+
+
+chat_hub = _make_hub()
@@ -0,0 +1,109 @@
+# backend/app/services/circuit.py
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Автомат closed -> open -> half_open -> closed поверх скользящего окна вызовов.
+
+    Вызов считается неудачным, если он упал или длился дольше slow_call_s.
+    Когда в окне window_s набралось не меньше min_calls вызовов и доля неудач
+    достигла failure_ratio, цепь размыкается на cooldown_s: все вызовы сразу
+    отклоняются. Затем пропускается до half_open_probes пробных вызовов;
+    удачная проба замыкает цепь, неудачная снова размыкает.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        min_calls: int = 10,
+        window_s: float = 30.0,
+        slow_call_s: float = 1.0,
+        cooldown_s: float = 15.0,
+        half_open_probes: int = 1,
+    ) -> None:
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_s = window_s
+        self.slow_call_s = slow_call_s
+        self.cooldown_s = cooldown_s
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (время завершения, успех, длительность)
+        self._window: Deque[Tuple[float, bool, float]] = deque()
+        self.counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def _trim(self, now: float) -> None:
+        while self._window and self._window[0][0] < now - self.window_s:
+            self._window.popleft()
+
+    def allow(self) -> bool:
+        """Можно ли сейчас делать вызов. При True вызывающий обязан потом вызвать record()."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.cooldown_s:
+                self.counters["rejected"] += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.counters["rejected"] += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        now = time.monotonic()
+        slow = latency_s > self.slow_call_s
+        success = ok and not slow
+        self.counters["calls"] += 1
+        if not ok:
+            self.counters["failures"] += 1
+        if slow:
+            self.counters["slow_calls"] += 1
+
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if success:
+                self.state = CLOSED
+                self._window.clear()
+            else:
+                self._open(now)
+            return
+
+        self._window.append((now, success, latency_s))
+        self._trim(now)
+        if self.state == CLOSED and len(self._window) >= self.min_calls:
+            failed = sum(1 for _, s, _ in self._window if not s)
+            if failed / len(self._window) >= self.failure_ratio:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        self._window.clear()
+        self.counters["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._trim(now)
+        latencies = sorted(l for _, _, l in self._window)
+        return {
+            "state": self.state,
+            "window_calls": len(self._window),
+            "window_failures": sum(1 for _, s, _ in self._window if not s),
+            "window_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            **self.counters,
+        }
@@ -0,0 +1,26 @@
+# backend/app/services/cursors.py
+
+import base64
+from datetime import datetime, timezone
+from typing import List, Optional
+
+
+def encode_cursor(*parts: object, sep: str = "|") -> str:
+    """Непрозрачный курсор пагинации: поля через sep в urlsafe base64 без паддинга."""
+    raw = sep.join(str(p) for p in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, count: int, sep: str = "|") -> Optional[List[str]]:
+    """Поля курсора строками; None, если курсор битый или полей не count."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        return None
+    parts = raw.split(sep)
+    return parts if len(parts) == count else None
+
+
+def as_utc(stamp: datetime) -> datetime:
+    # SQLite отдаёт naive datetime, а пишем мы всегда в UTC
+    return stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc)
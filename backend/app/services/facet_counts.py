@@ -0,0 +1,101 @@
+# backend/app/services/facet_counts.py
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import dialect_insert
+from ..models import FacetCount
+from .profile_tokens import FACETS, Facets
+
+ALL_CITIES = ""
+
+
+def _deltas(old_city: Optional[str], old: Facets, new_city: Optional[str], new: Facets) -> Counter:
+    deltas: Counter = Counter()
+    for facet, before, after in zip(FACETS, old, new):
+        for token in after - before:
+            deltas[(facet, ALL_CITIES, token)] += 1
+        for token in before - after:
+            deltas[(facet, ALL_CITIES, token)] -= 1
+        if old_city:
+            for token in before:
+                deltas[(facet, old_city, token)] -= 1
+        if new_city:
+            for token in after:
+                deltas[(facet, new_city, token)] += 1
+    return Counter({key: delta for key, delta in deltas.items() if delta})
+
+
+async def apply_change(
+    db: AsyncSession,
+    old_city: Optional[str],
+    old: Facets,
+    new_city: Optional[str],
+    new: Facets,
+) -> None:
+    """
+    Инкрементально обновляет facet_counts после изменения одного профиля
+    (без commit — вызывается в транзакции обновления профиля).
+    """
+    deltas = _deltas(old_city, old, new_city, new)
+    if not deltas:
+        return
+    stmt = dialect_insert(FacetCount).values([
+        {"facet": facet, "city": city, "token": token, "count": delta}
+        for (facet, city, token), delta in deltas.items()
+    ])
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FacetCount.facet, FacetCount.city, FacetCount.token],
+            set_={"count": FacetCount.count + stmt.excluded.count},
+        )
+    )
+    decreased = [key for key, delta in deltas.items() if delta < 0]
+    if decreased:
+        await db.execute(
+            delete(FacetCount).where(
+                FacetCount.count <= 0,
+                or_(*[
+                    and_(FacetCount.facet == facet, FacetCount.city == city, FacetCount.token == token)
+                    for facet, city, token in decreased
+                ]),
+            )
+        )
+
+
+async def top(db: AsyncSession, facet: str, limit: int, city: str = ALL_CITIES) -> List[Tuple[str, int]]:
+    res = await db.execute(
+        select(FacetCount.token, FacetCount.count)
+        .where(FacetCount.facet == facet, FacetCount.city == city)
+        .order_by(FacetCount.count.desc(), FacetCount.token.asc())
+        .limit(limit)
+    )
+    return [(token, count) for token, count in res.all()]
+
+
+async def top_per_city(db: AsyncSession, facet: str, limit: int) -> Dict[str, List[Tuple[str, int]]]:
+    ranked = (
+        select(
+            FacetCount.city.label("city"),
+            FacetCount.token.label("token"),
+            FacetCount.count.label("count"),
+            func.row_number().over(
+                partition_by=FacetCount.city,
+                order_by=(FacetCount.count.desc(), FacetCount.token.asc()),
+            ).label("rn"),
+        )
+        .where(FacetCount.facet == facet, FacetCount.city != ALL_CITIES)
+        .subquery()
+    )
+    res = await db.execute(
+        select(ranked.c.city, ranked.c.token, ranked.c.count)
+        .where(ranked.c.rn <= limit)
+        .order_by(ranked.c.city, ranked.c.rn)
+    )
+    result: Dict[str, List[Tuple[str, int]]] = {}
+    for city, token, count in res.all():
+        result.setdefault(city, []).append((token, count))
+    return result
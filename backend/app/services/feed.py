@@ -0,0 +1,80 @@
+# backend/app/services/feed.py
+
+import itertools
+import os
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from . import cursors
+
+FEED_DEPTH = int(os.getenv("FEED_DEPTH", "500"))
+FEED_SNAPSHOT_TTL = float(os.getenv("FEED_SNAPSHOT_TTL", "600"))
+FEED_MAX_USERS = int(os.getenv("FEED_MAX_USERS", "10000"))
+
+
+class Snapshot:
+    """Ранжированный список кандидатов, зафиксированный на момент первой страницы."""
+
+    __slots__ = ("id", "user_ids", "expires_at")
+
+    def __init__(self, snapshot_id: int, user_ids: Iterable[int], ttl: float) -> None:
+        self.id = snapshot_id
+        self.user_ids = array("I", user_ids)
+        self.expires_at = time.monotonic() + ttl
+
+    def page(self, offset: int, limit: int) -> Tuple[list, Optional[int]]:
+        """Срез [offset, offset+limit) и offset следующей страницы (None, если это конец)."""
+        end = offset + limit
+        next_offset = end if end < len(self.user_ids) else None
+        return self.user_ids[offset:end].tolist(), next_offset
+
+
+class FeedSnapshots:
+    """По одному снимку выдачи на пользователя, в памяти процесса, с TTL и LRU."""
+
+    def __init__(self, ttl: float = FEED_SNAPSHOT_TTL, max_users: int = FEED_MAX_USERS) -> None:
+        self.ttl = ttl
+        self.max_users = max_users
+        self._ids = itertools.count(1)
+        self._snapshots: "OrderedDict[int, Snapshot]" = OrderedDict()
+
+    def put(self, user_id: int, user_ids: Iterable[int]) -> Snapshot:
+        snapshot = Snapshot(next(self._ids), user_ids, self.ttl)
+        self._snapshots[user_id] = snapshot
+        self._snapshots.move_to_end(user_id)
+        while len(self._snapshots) > self.max_users:
+            self._snapshots.popitem(last=False)
+        return snapshot
+
+    def get(self, user_id: int, snapshot_id: int) -> Optional[Snapshot]:
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None or snapshot.id != snapshot_id:
+            return None
+        if snapshot.expires_at <= time.monotonic():
+            del self._snapshots[user_id]
+            return None
+        self._snapshots.move_to_end(user_id)
+        return snapshot
+
+    def drop(self, user_id: int) -> None:
+        self._snapshots.pop(user_id, None)
+
+
+def encode_cursor(snapshot_id: int, offset: int) -> str:
+    return cursors.encode_cursor(snapshot_id, offset, sep=":")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    parts = cursors.decode_cursor(cursor, 2, sep=":")
+    try:
+        snapshot_id, offset = (int(x) for x in parts)
+    except Exception:
+        return None
+    if snapshot_id < 0 or offset < 0:
+        return None
+    return snapshot_id, offset
+
+
+feed_snapshots = FeedSnapshots()
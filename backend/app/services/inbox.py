@@ -0,0 +1,112 @@
+# backend/app/services/inbox.py
+
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Conversation, Message, User, UserPhoto
+from . import cursors
+from .photo_variants import photo_url_column
+
+# Длина превью последнего сообщения (обрезается на стороне БД)
+INBOX_PREVIEW_LEN = int(os.getenv("INBOX_PREVIEW_LEN", "120"))
+
+
+def encode_cursor(last_activity_at: datetime, conversation_id: int) -> str:
+    return cursors.encode_cursor(cursors.as_utc(last_activity_at).isoformat(), conversation_id)
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    parts = cursors.decode_cursor(cursor, 2)
+    try:
+        stamp, conversation_id = parts
+        return cursors.as_utc(datetime.fromisoformat(stamp)), int(conversation_id)
+    except Exception:
+        return None
+
+
+async def load_inbox(
+    db: AsyncSession,
+    user_id: int,
+    after: Optional[Tuple[datetime, int]],
+    limit: int,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Страница инбокса одним запросом: собеседник, его основное фото, превью
+    последнего сообщения и число непрочитанных. Порядок — по last_activity_at
+    (затем id) по убыванию, продолжение — по курсору (after).
+    """
+    is_user1 = Conversation.user1_id == user_id
+    partner_id = case((is_user1, Conversation.user2_id), else_=Conversation.user1_id)
+    last_read = case((is_user1, Conversation.user1_last_read_id), else_=Conversation.user2_last_read_id)
+
+    # Непрочитанные — диапазон по индексу (conversation_id, id) после отметки прочтения
+    unread = (
+        select(func.count())
+        .where(
+            Message.conversation_id == Conversation.id,
+            Message.id > last_read,
+            Message.sender_id != user_id,
+        )
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    # Тот же порядок выбора фото, что и в avatars.primary_photo_paths
+    photo = (
+        select(photo_url_column("avatar"))
+        .where(UserPhoto.user_id == partner_id)
+        .order_by(
+            UserPhoto.is_primary.desc(),
+            func.coalesce(UserPhoto.upload_order, 999999).asc(),
+            UserPhoto.uploaded_at.desc(),
+        )
+        .limit(1)
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+
+    stmt = (
+        select(
+            Conversation.id,
+            Conversation.last_activity_at,
+            User.id.label("partner_id"),
+            User.name.label("partner_name"),
+            photo.label("photo_path"),
+            Message.id.label("message_id"),
+            Message.sender_id,
+            func.substr(Message.body, 1, INBOX_PREVIEW_LEN).label("preview"),
+            Message.created_at,
+            unread.label("unread_count"),
+        )
+        .join(User, User.id == partner_id)
+        .outerjoin(Message, Message.id == Conversation.last_message_id)
+        .where(or_(Conversation.user1_id == user_id, Conversation.user2_id == user_id))
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(Conversation.last_activity_at, Conversation.id) < tuple_(*after))
+    stmt = stmt.order_by(Conversation.last_activity_at.desc(), Conversation.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(stmt)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [
+        {
+            "conversation_id": r.id,
+            "partner": {"id": r.partner_id, "name": r.partner_name, "photo_path": r.photo_path},
+            "last_message": None if r.message_id is None else {
+                "id": r.message_id,
+                "sender_id": r.sender_id,
+                "preview": r.preview,
+                "created_at": r.created_at,
+            },
+            "last_activity_at": r.last_activity_at,
+            "unread_count": r.unread_count,
+        }
+        for r in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].last_activity_at, rows[-1].id) if has_more and rows else None
+    return items, next_cursor
@@ -0,0 +1,44 @@
+# backend/app/services/match_sets.py
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import MatchSet
+from .cursors import as_utc
+
+# Сколько живёт сохранённый ранжированный набор (ML или фоновый пересчёт)
+MATCH_SET_TTL_S = float(os.getenv("MATCH_SET_TTL_S", "600"))
+
+
+async def load(db: AsyncSession, user_id: int, max_age_s: float = MATCH_SET_TTL_S) -> Optional[List[int]]:
+    """Ранжированный набор user_id для пользователя, если он не старше max_age_s."""
+    res = await db.execute(
+        select(MatchSet).where(MatchSet.user_id == user_id).order_by(MatchSet.id.desc()).limit(1)
+    )
+    row = res.scalar_one_or_none()
+    if row is None or not isinstance(row.matched_user_ids, list):
+        return None
+    stamp = row.updated_at or row.created_at
+    if stamp is None or as_utc(stamp) < datetime.now(timezone.utc) - timedelta(seconds=max_age_s):
+        return None
+    return [int(x) for x in row.matched_user_ids]
+
+
+async def store(db: AsyncSession, user_id: int, user_ids: List[int]) -> None:
+    """Сохраняет набор (без commit): обновляет строку пользователя или создаёт новую."""
+    res = await db.execute(
+        update(MatchSet)
+        .where(MatchSet.user_id == user_id)
+        .values(matched_user_ids=list(user_ids), updated_at=func.now())
+    )
+    if not res.rowcount:
+        db.add(MatchSet(user_id=user_id, matched_user_ids=list(user_ids), updated_at=func.now()))
+
+
+async def invalidate(db: AsyncSession, user_id: int) -> None:
+    """Удаляет сохранённый набор (без commit)."""
+    await db.execute(delete(MatchSet).where(MatchSet.user_id == user_id))
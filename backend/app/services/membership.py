@@ -0,0 +1,56 @@
+# backend/app/services/membership.py
+
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Участники беседы не меняются после создания, поэтому кэш не требует инвалидации
+CHAT_MEMBERSHIP_MAX = int(os.getenv("CHAT_MEMBERSHIP_MAX", "100000"))
+
+Pair = Tuple[int, int]
+
+
+class ConversationMembership:
+    """
+    LRU в памяти процесса: conversation_id -> (user1_id, user2_id) и обратно
+    (user1_id, user2_id) -> conversation_id. Заполняется при создании беседы
+    и лениво при первом обращении к ней.
+    """
+
+    def __init__(self, max_size: int = CHAT_MEMBERSHIP_MAX) -> None:
+        self.max_size = max_size
+        self._by_id: "OrderedDict[int, Pair]" = OrderedDict()
+        self._by_pair: Dict[Pair, int] = {}
+        self.counters = {"hits": 0, "misses": 0}
+
+    def get(self, conversation_id: int) -> Optional[Pair]:
+        pair = self._by_id.get(conversation_id)
+        if pair is None:
+            self.counters["misses"] += 1
+            return None
+        self._by_id.move_to_end(conversation_id)
+        self.counters["hits"] += 1
+        return pair
+
+    def get_by_pair(self, user1_id: int, user2_id: int) -> Optional[int]:
+        conversation_id = self._by_pair.get((user1_id, user2_id))
+        if conversation_id is None:
+            self.counters["misses"] += 1
+            return None
+        self._by_id.move_to_end(conversation_id)
+        self.counters["hits"] += 1
+        return conversation_id
+
+    def put(self, conversation_id: int, user1_id: int, user2_id: int) -> None:
+        self._by_id[conversation_id] = (user1_id, user2_id)
+        self._by_id.move_to_end(conversation_id)
+        self._by_pair[(user1_id, user2_id)] = conversation_id
+        while len(self._by_id) > self.max_size:
+            _, pair = self._by_id.popitem(last=False)
+            self._by_pair.pop(pair, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._by_id), **self.counters}
+
+
+conversation_members = ConversationMembership()
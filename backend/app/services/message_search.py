@@ -0,0 +1,90 @@
+# backend/app/services/message_search.py
+
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import cursors
+
+# Полнотекстовый индекс сообщений (SQLite FTS5, создаётся миграцией 5).
+# Таблица contentless: хранит только индекс, текст берётся из messages.
+# Колонка members — токены участников беседы ("u12 u57"), чтобы ограничение
+# «только мои беседы» выполнялось внутри FTS-индекса, а не фильтром после него.
+FTS_TABLE = "messages_fts"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_SEARCH_SQL = text(f"""
+    SELECT m.id, m.conversation_id, m.sender_id, m.body, hits.rank
+    FROM (
+        SELECT rowid AS id, bm25({FTS_TABLE}, 1.0, 0.0) AS rank
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :query
+    ) AS hits
+    JOIN messages m ON m.id = hits.id
+    WHERE (hits.rank, hits.id) > (:after_rank, :after_id)
+    ORDER BY hits.rank, hits.id
+    LIMIT :limit
+""")
+
+
+def members_token(user_id: int) -> str:
+    return f"u{user_id}"
+
+
+def build_query(q: str, user_id: int) -> Optional[str]:
+    """
+    Пользовательский ввод -> выражение FTS5: каждое слово в кавычках (синтаксис
+    FTS5 из запроса не исполняется), последнее — как префикс, все через AND.
+    """
+    terms = _TERM_RE.findall(q.lower())
+    if not terms:
+        return None
+    body = " ".join(f'"{t}"' for t in terms[:-1])
+    body = f'{body} "{terms[-1]}"*'.strip()
+    return f'members:"{members_token(user_id)}" AND body:({body})'
+
+
+def encode_cursor(rank: float, message_id: int) -> str:
+    return cursors.encode_cursor(repr(rank), message_id)
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[float, int]]:
+    parts = cursors.decode_cursor(cursor, 2)
+    try:
+        rank, message_id = parts
+        return float(rank), int(message_id)
+    except Exception:
+        return None
+
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: int,
+    q: str,
+    after: Optional[Tuple[float, int]],
+    limit: int,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Сообщения из бесед пользователя по релевантности (bm25, лучшие первыми),
+    keyset-пагинация по (rank, id).
+    """
+    query = build_query(q, user_id)
+    if query is None:
+        return [], None
+    after_rank, after_id = after if after is not None else (float("-inf"), 0)
+    res = await db.execute(
+        _SEARCH_SQL,
+        {"query": query, "after_rank": after_rank, "after_id": after_id, "limit": limit + 1},
+    )
+    rows = res.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {"id": r.id, "conversation_id": r.conversation_id, "sender_id": r.sender_id, "body": r.body}
+        for r in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].rank, rows[-1].id) if has_more and rows else None
+    return items, next_cursor
@@ -1,38 +1,236 @@
 # backend/app/services/ml.py
 
+import asyncio
 import os
-from typing import List
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+from ..db import AsyncSessionLocal
+from . import match_sets
+from .circuit import CircuitBreaker
 
 try:
     import httpx  # type: ignore
 except Exception:  # pragma: no cover
     httpx = None  # type: ignore
 
+try:
+    import h2  # type: ignore  # noqa: F401  (нужен httpx для HTTP/2)
+    HTTP2_AVAILABLE = True
+except Exception:  # pragma: no cover
+    HTTP2_AVAILABLE = False
+
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "http://127.0.0.1:8001")
+ML_TIMEOUT = float(os.getenv("ML_TIMEOUT", "5.0"))
+ML_MAX_CONNECTIONS = int(os.getenv("ML_MAX_CONNECTIONS", "100"))
+ML_MAX_KEEPALIVE = int(os.getenv("ML_MAX_KEEPALIVE", "20"))
+ML_KEEPALIVE_EXPIRY = float(os.getenv("ML_KEEPALIVE_EXPIRY", "30"))
+ML_HTTP2 = os.getenv("ML_HTTP2", "1") not in ("0", "false", "no")
 
-async def get_recommendations_for_user(user_id: int) -> List[int]:
+# Бюджет ожидания ML, после которого параллельно стартует локальный скоринг
+ML_LATENCY_BUDGET_MS = float(os.getenv("ML_LATENCY_BUDGET_MS", "300"))
+ML_BREAKER_FAILURE_RATIO = float(os.getenv("ML_BREAKER_FAILURE_RATIO", "0.5"))
+ML_BREAKER_MIN_CALLS = int(os.getenv("ML_BREAKER_MIN_CALLS", "10"))
+ML_BREAKER_WINDOW_S = float(os.getenv("ML_BREAKER_WINDOW_S", "30"))
+ML_BREAKER_SLOW_CALL_MS = float(os.getenv("ML_BREAKER_SLOW_CALL_MS", "1000"))
+ML_BREAKER_COOLDOWN_S = float(os.getenv("ML_BREAKER_COOLDOWN_S", "15"))
+
+# Кэш ответов ML по пользователю (память + таблица match_sets); срок жизни —
+# общий match_sets.MATCH_SET_TTL_S, иначе набор из БД переживал бы кэш в памяти
+ML_CACHE_MAX_USERS = int(os.getenv("ML_CACHE_MAX_USERS", "10000"))
+
+
+def _parse_user_ids(data, user_id: int) -> List[int]:
     """
-    Обращается к внешнему ML-сервису за списком рекомендаций для данного пользователя.
     Ожидаемый ответ: {"user_ids": [2,5,10, ...]} или {"items": [2,5,10]}
-    В случае ошибки или недоступности сервиса — возвращает пустой список.
-    """
-    if httpx is None:
-        return []
-    url = f"{ML_SERVICE_URL.rstrip('/')}/recommendations"
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.post(url, json={"user_id": user_id})
+    или просто список.
+    """
+    if isinstance(data, dict):
+        if isinstance(data.get("user_ids"), list):
+            return [int(x) for x in data.get("user_ids") if x != user_id]
+        if isinstance(data.get("items"), list):
+            return [int(x) for x in data.get("items") if x != user_id]
+    # Если вернули просто список
+    if isinstance(data, list):
+        return [int(x) for x in data if x != user_id]
+    return []
+
+
+class MLClient:
+    """
+    Долгоживущий клиент ML-сервиса с пулом keep-alive соединений.
+    Создаётся в lifespan приложения и закрывается при остановке.
+    Вызовы идут через CircuitBreaker: пока цепь разомкнута, клиент
+    сразу возвращает пустой список и выдача строится локально.
+    """
+
+    def __init__(
+        self,
+        base_url: str = ML_SERVICE_URL,
+        timeout: float = ML_TIMEOUT,
+        max_connections: int = ML_MAX_CONNECTIONS,
+        max_keepalive: int = ML_MAX_KEEPALIVE,
+        keepalive_expiry: float = ML_KEEPALIVE_EXPIRY,
+        http2: bool = ML_HTTP2,
+        latency_budget_ms: float = ML_LATENCY_BUDGET_MS,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.latency_budget_s = latency_budget_ms / 1000.0
+        self.breaker = breaker or CircuitBreaker(
+            failure_ratio=ML_BREAKER_FAILURE_RATIO,
+            min_calls=ML_BREAKER_MIN_CALLS,
+            window_s=ML_BREAKER_WINDOW_S,
+            slow_call_s=ML_BREAKER_SLOW_CALL_MS / 1000.0,
+            cooldown_s=ML_BREAKER_COOLDOWN_S,
+        )
+        self.counters = {"hedged": 0, "hedge_ml_wins": 0, "hedge_local_wins": 0}
+        self._client = None
+
+    async def start(self) -> None:
+        if httpx is None or self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            http2=self.http2,
+        )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_recommendations_for_user(self, user_id: int) -> List[int]:
+        """
+        Обращается к внешнему ML-сервису за списком рекомендаций для данного пользователя.
+        В случае ошибки или недоступности сервиса — возвращает пустой список.
+        """
+        if self._client is None or not self.breaker.allow():
+            return []
+        started = time.monotonic()
+        ok = False
+        try:
+            resp = await self._client.post("/recommendations", json={"user_id": user_id})
             if resp.status_code != 200:
                 return []
-            data = resp.json()
-            if isinstance(data, dict):
-                if isinstance(data.get("user_ids"), list):
-                    return [int(x) for x in data.get("user_ids") if x != user_id]
-                if isinstance(data.get("items"), list):
-                    return [int(x) for x in data.get("items") if x != user_id]
-            # Если вернули просто список
-            if isinstance(data, list):
-                return [int(x) for x in data if x != user_id]
+            result = _parse_user_ids(resp.json(), user_id)
+            ok = True
+            return result
+        except Exception:
             return []
-    except Exception:
-        return []
+        finally:
+            # Отмена (проиграли локальному скорингу) тоже считается неудачей
+            self.breaker.record(ok, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.stats(), **self.counters}
+
+
+class MLResultCache:
+    """
+    Кэш списков user_ids от ML по пользователю с тем же TTL, что у match_sets.
+
+    Одновременные запросы одного пользователя ждут один общий вызов ML
+    (single-flight). Результат кладётся в память и в match_sets, откуда
+    его читает ranking.rank_candidates, поэтому после рестарта тёплые наборы
+    берутся из БД, а не из ML. Пустые ответы (ошибка, разомкнутая цепь)
+    не кэшируются.
+    """
+
+    def __init__(self, ttl_s: float = match_sets.MATCH_SET_TTL_S, max_users: int = ML_CACHE_MAX_USERS) -> None:
+        self.ttl_s = ttl_s
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, Tuple[List[int], float]]" = OrderedDict()
+        self._inflight: Dict[int, "asyncio.Task[List[int]]"] = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    async def get(self, user_id: int, fetch: Callable[[int], Awaitable[List[int]]]) -> List[int]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.counters["hits"] += 1
+                return entry[0]
+            del self._entries[user_id]
+
+        task = self._inflight.get(user_id)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._load(user_id, fetch))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[user_id] = task
+        # shield: отмена одного запроса (например, хедж проиграл) не отменяет общий вызов
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: int, fetch: Callable[[int], Awaitable[List[int]]]) -> List[int]:
+        task = asyncio.current_task()
+        self.counters["misses"] += 1
+        try:
+            user_ids = await fetch(user_id)
+            # Если пока шёл вызов набор инвалидировали — результат не сохраняем
+            if user_ids and self._inflight.get(user_id) is task:
+                self._put(user_id, user_ids)
+                async with AsyncSessionLocal() as db:
+                    await match_sets.store(db, user_id, user_ids)
+                    await db.commit()
+            return user_ids
+        finally:
+            if self._inflight.get(user_id) is task:
+                del self._inflight[user_id]
+
+    def _put(self, user_id: int, user_ids: List[int]) -> None:
+        self._entries[user_id] = (user_ids, time.monotonic() + self.ttl_s)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Сбрасывает набор пользователя в памяти после свайпа или правки профиля.
+        Сохранённый match_sets не трогает: после свайпа он остаётся годным
+        (просмотренные отсекаются при выдаче), а при правке профиля его
+        удаляет вызывающий код.
+        """
+        self.counters["invalidations"] += 1
+        self._entries.pop(user_id, None)
+        self._inflight.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"users": len(self._entries), "inflight": len(self._inflight), **self.counters}
+
+
+ml_results = MLResultCache()
+
+
+_client_lock = asyncio.Lock()
+
+
+async def get_ml_client(request: Request) -> MLClient:
+    """
+    Зависимость FastAPI: общий ML-клиент. Создаётся и закрывается в lifespan;
+    если сервер запущен без него (uvicorn --lifespan=off) — лениво, при первом запросе.
+    """
+    client = getattr(request.app.state, "ml_client", None)
+    if client is None:
+        async with _client_lock:
+            client = getattr(request.app.state, "ml_client", None)
+            if client is None:
+                client = MLClient()
+                await client.start()
+                request.app.state.ml_client = client
+    return client
@@ -0,0 +1,291 @@
+# backend/app/services/photo_variants.py
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import func, select, update
+
+from ..db import AsyncSessionLocal
+from ..models import UserPhoto
+
+try:
+    from PIL import Image, ImageOps, features  # type: ignore
+except Exception:  # pragma: no cover
+    Image = None  # type: ignore
+
+# EXIF-тег ориентации снимка
+ORIENTATION = 0x0112
+
+# Производные размеры фото: имя -> максимальная сторона в пикселях
+VARIANTS = {"avatar": 128, "card": 512, "full": 1600}
+# Колонки UserPhoto с путями производных
+VARIANT_COLUMNS = {"avatar": "avatar_path", "card": "card_path", "full": "full_path"}
+
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
+PHOTO_QUEUE_MAX = int(os.getenv("PHOTO_QUEUE_MAX", "64"))
+PHOTO_FORMAT = os.getenv("PHOTO_FORMAT", "webp").lower()  # webp | jpeg
+PHOTO_QUALITY = int(os.getenv("PHOTO_QUALITY", "82"))
+
+# UserPhoto.variants_status
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+
+def _strip_metadata(src_path: Path) -> None:
+    """
+    Оригинал тоже раздаётся из /uploads, поэтому EXIF (в том числе GPS)
+    из него удаляется: файл перезаписывается без метаданных. JPEG без
+    поворота — с исходными таблицами квантования (quality="keep").
+    """
+    with Image.open(src_path) as img:
+        exif = img.getexif()
+        if not exif and not img.info.get("exif"):
+            return
+        # MPO (многокадровый JPEG с телефонов) сохраняем первым кадром как JPEG
+        fmt = "JPEG" if img.format == "MPO" else img.format
+        if fmt != "JPEG" and getattr(img, "n_frames", 1) > 1:
+            return
+        params: Dict[str, Any] = {}
+        if img.info.get("icc_profile"):
+            params["icc_profile"] = img.info["icc_profile"]
+        if exif.get(ORIENTATION, 1) != 1:
+            # Тег ориентации удаляется вместе с EXIF — поворот переносим в пиксели
+            img = ImageOps.exif_transpose(img)
+            if fmt == "JPEG":
+                params["quality"] = 95
+        elif fmt == "JPEG":
+            params["quality"] = "keep"
+        tmp = src_path.with_name(f"{src_path.name}.tmp")
+        img.save(tmp, fmt, **params)
+    os.replace(tmp, src_path)
+
+
+def _render_variants(src: str, fmt: str, quality: int) -> Dict[str, str]:
+    """
+    Выполняется в отдельном процессе: убирает метаданные из оригинала,
+    поворачивает по EXIF и сохраняет уменьшенные копии рядом с ним.
+    Возвращает {вариант: путь}.
+    """
+    src_path = Path(src)
+    _strip_metadata(src_path)
+    ext = "webp" if fmt == "webp" else "jpg"
+    out: Dict[str, str] = {}
+    with Image.open(src_path) as img:
+        # Для JPEG декодируем сразу в уменьшенном масштабе — заметно быстрее
+        largest = max(VARIANTS.values())
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        # Прозрачность сохраняем только в WebP; JPEG — всегда RGB
+        keep_alpha = fmt == "webp" and img.mode in ("RGBA", "LA", "P")
+        img = img.convert("RGBA" if keep_alpha else "RGB")
+        # От большего к меньшему: каждую копию уменьшаем из предыдущей
+        for name, side in sorted(VARIANTS.items(), key=lambda kv: -kv[1]):
+            img = img.copy()
+            img.thumbnail((side, side), Image.Resampling.LANCZOS)
+            dst = src_path.with_name(f"{src_path.stem}_{name}.{ext}")
+            if fmt == "webp":
+                img.save(dst, "WEBP", quality=quality, method=4)
+            else:
+                img.save(dst, "JPEG", quality=quality, optimize=True, progressive=True)
+            out[name] = dst.as_posix()
+    return out
+
+
+class PhotoPipeline:
+    """
+    Фоновая генерация производных фото в ограниченном ProcessPoolExecutor.
+    Пока варианты не готовы (или нет Pillow), эндпоинты отдают оригинал из photo_path.
+
+    Очередь — сама таблица: фото в статусе pending, не поместившиеся в
+    queue_max одновременных задач, догружаются страницами по id по мере
+    освобождения слотов. Ошибка обработки записывается в variants_error,
+    и фото в статусе failed больше не берётся.
+    """
+
+    def __init__(self, workers: int = PHOTO_WORKERS, queue_max: int = PHOTO_QUEUE_MAX) -> None:
+        self.workers = workers
+        self.queue_max = queue_max
+        self.fmt = PHOTO_FORMAT
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._starting: Optional["asyncio.Task[None]"] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._queued: Set[int] = set()
+        # Догрузка pending из БД: последний просмотренный id и флаг «есть ещё»
+        self._refilling: Optional["asyncio.Task[None]"] = None
+        self._cursor = 0
+        self._backlog = False
+        self.counters = {"submitted": 0, "done": 0, "deferred": 0, "errors": 0, "skipped": 0}
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    async def start(self) -> None:
+        if not self.available or self._executor is not None:
+            return
+        if self.fmt == "webp" and not features.check("webp"):
+            self.fmt = "jpeg"
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Фото, загруженные до запуска пайплайна или не обработанные до рестарта
+        self._backlog = True
+        self._refill()
+
+    def submit(self, photo_id: int, photo_path: str) -> bool:
+        """
+        Ставит фото в обработку после commit загрузки. Если слотов нет, фото
+        остаётся pending и будет взято из БД, когда освободится место.
+        """
+        if not self.available:
+            self.counters["skipped"] += 1
+            return False
+        if self._executor is None:
+            # Сервер запущен без lifespan: пайплайн стартует при первой загрузке
+            # и сам подберёт это фото вместе с остальными pending
+            if self._starting is None:
+                self._starting = asyncio.create_task(self.start())
+            self.counters["deferred"] += 1
+            return False
+        if len(self._tasks) >= self.queue_max:
+            self.counters["deferred"] += 1
+            self._backlog = True
+            self._cursor = min(self._cursor, photo_id - 1)
+            return False
+        self._spawn(photo_id, photo_path)
+        return True
+
+    def _spawn(self, photo_id: int, photo_path: str) -> None:
+        self.counters["submitted"] += 1
+        self._queued.add(photo_id)
+        task = asyncio.create_task(self._process(photo_id, photo_path))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: "asyncio.Task[None]") -> None:
+        self._tasks.discard(task)
+        if self._backlog and not task.cancelled():
+            self._refill()
+
+    def _refill(self) -> None:
+        if self._refilling is None or self._refilling.done():
+            self._refilling = asyncio.create_task(self._load_backlog())
+            self._refilling.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _load_backlog(self) -> None:
+        """Догружает pending-фото страницами по id, пока есть свободные слоты."""
+        while self._executor is not None and self._backlog:
+            free = self.queue_max - len(self._tasks)
+            if free <= 0:
+                # Продолжим, когда завершится одна из задач
+                return
+            self._backlog = False
+            try:
+                async with AsyncSessionLocal() as db:
+                    res = await db.execute(
+                        select(UserPhoto.id, UserPhoto.photo_path)
+                        .where(UserPhoto.variants_status == PENDING, UserPhoto.id > self._cursor)
+                        .order_by(UserPhoto.id)
+                        .limit(free)
+                    )
+                    rows = res.all()
+            except Exception as e:
+                self._backlog = True
+                print(f"⚠️ Не удалось загрузить очередь фото: {e}")
+                return
+            for photo_id, photo_path in rows:
+                self._cursor = max(self._cursor, photo_id)
+                if photo_id not in self._queued:
+                    self._spawn(photo_id, photo_path)
+            if len(rows) == free:
+                self._backlog = True
+            else:
+                # Дошли до конца таблицы; следующий проход (если фото отложат) — с начала
+                self._cursor = 0
+
+    async def _process(self, photo_id: int, photo_path: str) -> None:
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            paths = await loop.run_in_executor(
+                executor, _render_variants, photo_path, self.fmt, PHOTO_QUALITY
+            )
+            async with AsyncSessionLocal() as db:
+                res = await db.execute(
+                    update(UserPhoto)
+                    .where(UserPhoto.id == photo_id)
+                    .values(
+                        {VARIANT_COLUMNS[name]: path for name, path in paths.items()}
+                        | {"variants_status": DONE, "variants_error": None}
+                    )
+                )
+                await db.commit()
+            if not res.rowcount:
+                # Фото удалили, пока шла обработка
+                remove_files(paths.values())
+            self.counters["done"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                # Процесс пула упал (например, по памяти на огромном файле) — пул пересоздаём,
+                # иначе все следующие фото тоже завершались бы ошибкой
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.counters["errors"] += 1
+            print(f"⚠️ Не удалось подготовить размеры фото {photo_id}: {e}")
+            await self._mark_failed(photo_id, e)
+        finally:
+            self._queued.discard(photo_id)
+
+    async def _mark_failed(self, photo_id: int, error: Exception) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(UserPhoto)
+                    .where(UserPhoto.id == photo_id)
+                    .values(variants_status=FAILED, variants_error=f"{type(error).__name__}: {error}"[:500])
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить ошибку обработки фото {photo_id}: {e}")
+
+    async def stop(self) -> None:
+        self._backlog = False
+        pending = [t for t in (self._starting, self._refilling) if t is not None] + list(self._tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._starting = self._refilling = None
+        self._cursor = 0
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "format": self.fmt,
+            "inflight": len(self._tasks),
+            "backlog": self._backlog,
+            **self.counters,
+        }
+
+
+def remove_files(paths) -> None:
+    for path in paths:
+        if not path:
+            continue
+        try:
+            Path(str(path)).unlink(missing_ok=True)
+        except Exception as e:
+            print(f"⚠️ Не удалось удалить файл {path}: {e}")
+
+
+def photo_url_column(size: str):
+    """Путь нужного размера с откатом на оригинал, если вариант ещё не готов."""
+    return func.coalesce(getattr(UserPhoto, VARIANT_COLUMNS[size]), UserPhoto.photo_path)
+
+
+photo_pipeline = PhotoPipeline()
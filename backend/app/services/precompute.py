@@ -0,0 +1,142 @@
+# backend/app/services/precompute.py
+
+import asyncio
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from ..db import AsyncSessionLocal
+from . import match_sets
+from .ml import MLClient
+from .ranking import accept, ensure_index, local_rank
+from .seen import seen_sets
+
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "4"))
+PRECOMPUTE_QUEUE_MAX = int(os.getenv("PRECOMPUTE_QUEUE_MAX", "10000"))
+PRECOMPUTE_SWEEP_S = float(os.getenv("PRECOMPUTE_SWEEP_S", "300"))
+PRECOMPUTE_ACTIVE_WINDOW_S = float(os.getenv("PRECOMPUTE_ACTIVE_WINDOW_S", "1800"))
+
+# Чем меньше число, тем раньше пользователь будет пересчитан
+PRIORITY_PROFILE_CHANGED = 0
+PRIORITY_ACTIVE = 1
+
+
+class PrecomputeWorker:
+    """
+    Фоновый пересчёт ранжированных наборов в match_sets.
+
+    Очередь с приоритетами: сначала пользователи, изменившие профиль,
+    затем недавно активные (их периодически подбирает sweep).
+    Одновременно обрабатывается не больше `concurrency` пользователей.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = PRECOMPUTE_CONCURRENCY,
+        queue_max: int = PRECOMPUTE_QUEUE_MAX,
+        sweep_s: float = PRECOMPUTE_SWEEP_S,
+        active_window_s: float = PRECOMPUTE_ACTIVE_WINDOW_S,
+    ) -> None:
+        self.concurrency = concurrency
+        self.queue_max = queue_max
+        self.sweep_s = sweep_s
+        self.active_window_s = active_window_s
+        self.ml_client: Optional[MLClient] = None
+        self._queue: Optional["asyncio.PriorityQueue"] = None
+        self._queued: Dict[int, int] = {}  # user_id -> лучший приоритет в очереди
+        self._active: Dict[int, float] = {}  # user_id -> время последнего запроса выдачи
+        self._seq = itertools.count()
+        self._tasks: List["asyncio.Task[None]"] = []
+        self.counters = {"enqueued": 0, "dropped": 0, "computed": 0, "ml": 0, "local": 0, "errors": 0}
+
+    def touch(self, user_id: int) -> None:
+        """Отмечает активность пользователя (запрос ленты рекомендаций)."""
+        self._active[user_id] = time.monotonic()
+
+    def enqueue(self, user_id: int, priority: int = PRIORITY_ACTIVE) -> bool:
+        if self._queue is None:
+            return False
+        queued = self._queued.get(user_id)
+        if queued is not None and queued <= priority:
+            return True
+        if self._queue.qsize() >= self.queue_max:
+            self.counters["dropped"] += 1
+            return False
+        self._queued[user_id] = priority
+        self._queue.put_nowait((priority, next(self._seq), user_id))
+        self.counters["enqueued"] += 1
+        return True
+
+    async def start(self, ml_client: Optional[MLClient]) -> None:
+        if self._tasks:
+            return
+        self.ml_client = ml_client
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_s)
+            cutoff = time.monotonic() - self.active_window_s
+            for user_id, seen_at in list(self._active.items()):
+                if seen_at < cutoff:
+                    del self._active[user_id]
+                else:
+                    self.enqueue(user_id, PRIORITY_ACTIVE)
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            priority, _, user_id = await self._queue.get()
+            try:
+                # Запись с худшим приоритетом могла остаться после повторной постановки
+                if self._queued.get(user_id) != priority:
+                    continue
+                del self._queued[user_id]
+                await self.compute(user_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"⚠️ Не удалось пересчитать рекомендации для {user_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def compute(self, user_id: int) -> List[int]:
+        async with AsyncSessionLocal() as db:
+            await ensure_index(db)
+            seen = await seen_sets.get(db, user_id, refresh=True)
+            user_ids: List[int] = []
+            if self.ml_client is not None:
+                # В фоне нет бюджета задержки — ждём ML целиком
+                user_ids = accept(await self.ml_client.get_recommendations_for_user(user_id), seen)
+            if user_ids:
+                self.counters["ml"] += 1
+            else:
+                user_ids = await local_rank(user_id, seen)
+                self.counters["local"] += 1
+            await match_sets.store(db, user_id, user_ids)
+            await db.commit()
+        self.counters["computed"] += 1
+        return user_ids
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "active_users": len(self._active),
+            "workers": max(0, len(self._tasks) - 1),
+            **self.counters,
+        }
+
+
+precompute_worker = PrecomputeWorker()
@@ -0,0 +1,185 @@
+# backend/app/services/profile_index.py
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .profile_tokens import (
+    EMPTY_FACETS,
+    FACETS,
+    Facets,
+    last_profile_change,
+    load_all_facets,
+    load_facets_since,
+)
+
+# Как часто подтягивать профили, изменённые через другие воркеры (сек.)
+PROFILE_INDEX_REFRESH_S = float(os.getenv("PROFILE_INDEX_REFRESH_S", "30"))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 0.0
+    inter = len(a & b)
+    union = len(a | b)
+    return (inter / union) if union else 0.0
+
+
+def compatibility(mine: Facets, theirs: Facets) -> float:
+    """Средний Jaccard по трём фасетам (interests, skills, goals)."""
+    return (jaccard(mine[0], theirs[0]) + jaccard(mine[1], theirs[1]) + jaccard(mine[2], theirs[2])) / 3.0
+
+
+def shared(mine: Facets, theirs: Facets) -> Dict[str, List[str]]:
+    return {
+        f"shared_{name}": sorted(a & b) if (a and b) else []
+        for name, a, b in zip(FACETS, mine, theirs)
+    }
+
+
+class ProfileIndex:
+    """
+    Инвертированный индекс профилей, живущий в памяти процесса.
+
+    Для каждого фасета хранится token -> множество user_id (posting list),
+    а для каждого пользователя — его собственные наборы токенов.
+    Локальный фолбэк рекомендаций перебирает только пользователей,
+    у которых есть хотя бы один общий токен с текущим.
+
+    PUT /profile обновляет индекс только в своём воркере; профили,
+    изменённые через другие, подтягиваются refresh() по profiles.updated_at.
+    """
+
+    def __init__(self, refresh_s: float = PROFILE_INDEX_REFRESH_S) -> None:
+        self.postings: Tuple[Dict[str, Set[int]], ...] = ({}, {}, {})
+        self.facets: Dict[int, Facets] = {}
+        # user_id, изменённые с момента последней выборки (см. scoring.ScoringEngine)
+        self.changed: Set[int] = set()
+        self.loaded = False
+        self.refresh_s = refresh_s
+        # Самая поздняя отметка изменения профиля, уже учтённая в индексе
+        self.watermark: Optional[datetime] = None
+        self._refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.facets)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.facets
+
+    def get(self, user_id: int) -> Facets:
+        return self.facets.get(user_id, EMPTY_FACETS)
+
+    def upsert(self, user_id: int, facets: Facets) -> None:
+        old = self.facets.get(user_id, EMPTY_FACETS)
+        for postings, before, after in zip(self.postings, old, facets):
+            for token in before - after:
+                ids = postings.get(token)
+                if ids is not None:
+                    ids.discard(user_id)
+                    if not ids:
+                        del postings[token]
+            for token in after - before:
+                postings.setdefault(token, set()).add(user_id)
+        self.facets[user_id] = facets
+        self.changed.add(user_id)
+
+    def remove(self, user_id: int) -> None:
+        if user_id in self.facets:
+            self.upsert(user_id, EMPTY_FACETS)
+            del self.facets[user_id]
+
+    def clear(self) -> None:
+        self.postings = ({}, {}, {})
+        self.facets = {}
+        self.changed = set()
+        self.loaded = False
+        self.watermark = None
+
+    def overlaps(self, mine: Facets) -> List[Dict[int, int]]:
+        """Для каждого фасета: user_id -> |A ∩ B|, посчитанное по posting lists."""
+        result: List[Dict[int, int]] = []
+        for postings, tokens in zip(self.postings, mine):
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                for uid in postings.get(token, ()):
+                    counts[uid] = counts.get(uid, 0) + 1
+            result.append(counts)
+        return result
+
+    def rank(self, user_id: int, limit: int = 50, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Топ-`limit` кандидатов для user_id в виде [(candidate_id, score), ...].
+        Score считается только для пользователей с общими токенами;
+        если их меньше `limit`, список добивается остальными с нулевым score.
+        """
+        mine = self.get(user_id)
+        skip = set(exclude)
+        skip.add(user_id)
+
+        overlaps = self.overlaps(mine)
+        candidates: Set[int] = set()
+        for counts in overlaps:
+            candidates.update(counts)
+        candidates -= skip
+
+        scored: List[Tuple[int, float]] = []
+        for uid in candidates:
+            theirs = self.facets[uid]
+            total = 0.0
+            for counts, a, b in zip(overlaps, mine, theirs):
+                inter = counts.get(uid, 0)
+                union = len(a) + len(b) - inter
+                total += (inter / union) if union else 0.0
+            scored.append((uid, round(total / 3.0, 4)))
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        scored = scored[:limit]
+
+        if len(scored) < limit:
+            for uid in self.facets:
+                if uid in candidates or uid in skip:
+                    continue
+                scored.append((uid, 0.0))
+                if len(scored) >= limit:
+                    break
+        return scored
+
+    async def load(self, db: AsyncSession) -> None:
+        """Полностью перестраивает индекс по таблице profile_tokens."""
+        # Отметку берём до чтения: изменения во время загрузки подтянет refresh()
+        watermark = await last_profile_change(db)
+        self.clear()
+        for uid, facets in (await load_all_facets(db)).items():
+            self.upsert(uid, facets)
+        self.watermark = watermark
+        self._refreshed_at = time.monotonic()
+        self.loaded = True
+
+    def stale(self) -> bool:
+        return time.monotonic() - self._refreshed_at >= self.refresh_s
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """
+        Инкрементально подтягивает профили, созданные или изменённые после
+        watermark. Окно перекрывается на refresh_s назад: транзакция могла
+        получить now() раньше, а закоммититься позже предыдущего refresh.
+        Возвращает число профилей, чьи токены поменялись.
+        """
+        self._refreshed_at = time.monotonic()
+        # Без отметки (индекс загружен по пустой таблице) — все профили
+        since = None if self.watermark is None else self.watermark - timedelta(seconds=self.refresh_s)
+        changed, watermark = await load_facets_since(db, since)
+        updated = 0
+        for uid, facets in changed.items():
+            if uid not in self.facets or self.facets[uid] != facets:
+                self.upsert(uid, facets)
+                updated += 1
+        if watermark is not None and (self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+        return updated
+
+
+profile_index = ProfileIndex()
@@ -0,0 +1,137 @@
+# backend/app/services/profile_tokens.py
+
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import dialect_insert
+from ..models import Profile, ProfileToken, Token, User
+
+FACETS = ("interests", "skills", "goals")
+
+Facets = Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]
+EMPTY_FACETS: Facets = (frozenset(), frozenset(), frozenset())
+
+
+def tokenize(s: Optional[str]) -> List[str]:
+    if not s:
+        return []
+    raw = [p.strip() for chunk in s.split(",") for p in chunk.split()]
+    return [x.lower() for x in raw if x]
+
+
+def facets_of(interests: Optional[str], skills: Optional[str], goals: Optional[str]) -> Facets:
+    return (
+        frozenset(tokenize(interests)),
+        frozenset(tokenize(skills)),
+        frozenset(tokenize(goals)),
+    )
+
+
+async def token_ids(db: AsyncSession, tokens: Iterable[str]) -> Dict[str, int]:
+    """Возвращает id токенов из словаря, добавляя недостающие."""
+    wanted = set(tokens)
+    if not wanted:
+        return {}
+    res = await db.execute(select(Token.text, Token.id).where(Token.text.in_(wanted)))
+    ids = dict(res.all())
+    missing = wanted - ids.keys()
+    if missing:
+        await db.execute(
+            dialect_insert(Token).values([{"text": t} for t in missing]).on_conflict_do_nothing()
+        )
+        res = await db.execute(select(Token.text, Token.id).where(Token.text.in_(missing)))
+        ids.update(res.all())
+    return ids
+
+
+async def load_facets(db: AsyncSession, user_id: int) -> Facets:
+    res = await db.execute(
+        select(ProfileToken.facet, Token.text)
+        .join(Token, Token.id == ProfileToken.token_id)
+        .where(ProfileToken.user_id == user_id)
+    )
+    buckets: Dict[str, set] = {f: set() for f in FACETS}
+    for facet, text in res.all():
+        buckets[facet].add(text)
+    return tuple(frozenset(buckets[f]) for f in FACETS)  # type: ignore[return-value]
+
+
+async def store_facets(db: AsyncSession, user_id: int, facets: Facets) -> Facets:
+    """
+    Заменяет токены профиля user_id на `facets` (без commit).
+    Возвращает предыдущие наборы токенов.
+    """
+    old = await load_facets(db, user_id)
+    if old == facets:
+        return old
+    ids = await token_ids(db, (t for tokens in facets for t in tokens))
+    await db.execute(delete(ProfileToken).where(ProfileToken.user_id == user_id))
+    rows = [
+        {"user_id": user_id, "facet": facet, "token_id": ids[t]}
+        for facet, tokens in zip(FACETS, facets)
+        for t in tokens
+    ]
+    if rows:
+        await db.execute(dialect_insert(ProfileToken).values(rows).on_conflict_do_nothing())
+    return old
+
+
+async def load_all_facets(db: AsyncSession) -> Dict[int, Facets]:
+    """Токены всех профилей (с существующим пользователем) для построения индекса."""
+    res = await db.execute(select(Profile.user_id).join(User, User.id == Profile.user_id))
+    buckets: Dict[int, Dict[str, set]] = {
+        uid: {f: set() for f in FACETS} for uid in res.scalars().all()
+    }
+    res = await db.execute(
+        select(ProfileToken.user_id, ProfileToken.facet, Token.text)
+        .join(Token, Token.id == ProfileToken.token_id)
+    )
+    for uid, facet, text in res.all():
+        if uid in buckets:
+            buckets[uid][facet].add(text)
+    return {
+        uid: tuple(frozenset(b[f]) for f in FACETS)  # type: ignore[misc]
+        for uid, b in buckets.items()
+    }
+
+
+def _profile_stamp():
+    # Новый профиль ещё ни разу не обновлялся — берём время создания
+    return func.coalesce(Profile.updated_at, Profile.created_at)
+
+
+async def last_profile_change(db: AsyncSession) -> Optional[datetime]:
+    return (await db.execute(select(func.max(_profile_stamp())))).scalar()
+
+
+async def load_facets_since(
+    db: AsyncSession, since: Optional[datetime]
+) -> Tuple[Dict[int, Facets], Optional[datetime]]:
+    """
+    Токены профилей, созданных или изменённых не раньше `since` (None — всех),
+    и самая поздняя отметка времени среди них (None — изменений нет).
+    """
+    stamp = _profile_stamp()
+    query = select(Profile.user_id, stamp).join(User, User.id == Profile.user_id)
+    if since is not None:
+        query = query.where(stamp >= since)
+    res = await db.execute(query)
+    rows = res.all()
+    if not rows:
+        return {}, None
+    buckets: Dict[int, Dict[str, set]] = {uid: {f: set() for f in FACETS} for uid, _ in rows}
+    res = await db.execute(
+        select(ProfileToken.user_id, ProfileToken.facet, Token.text)
+        .join(Token, Token.id == ProfileToken.token_id)
+        .where(ProfileToken.user_id.in_(buckets.keys()))
+    )
+    for uid, facet, text in res.all():
+        buckets[uid][facet].add(text)
+    facets = {
+        uid: tuple(frozenset(b[f]) for f in FACETS)  # type: ignore[misc]
+        for uid, b in buckets.items()
+    }
+    return facets, max((s for _, s in rows if s is not None), default=None)
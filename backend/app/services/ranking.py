@@ -0,0 +1,92 @@
+# backend/app/services/ranking.py
+
+import asyncio
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import match_sets
+from .feed import FEED_DEPTH
+from .ml import MLClient, ml_results
+from .profile_index import profile_index
+from .scoring import scoring_engine
+from .seen import SeenSet
+
+_index_lock = asyncio.Lock()
+
+
+async def ensure_index(db: AsyncSession) -> None:
+    """
+    Индекс профилей и матрицы скоринга строятся в lifespan; если сервер
+    запущен без него (uvicorn --lifespan=off) — лениво, при первой выдаче.
+    Раз в PROFILE_INDEX_REFRESH_S индекс догружает профили, изменённые
+    через другие воркеры (матрицы учитывают их через index.changed).
+    """
+    if profile_index.loaded and not profile_index.stale():
+        return
+    async with _index_lock:
+        if not profile_index.loaded:
+            await profile_index.load(db)
+            scoring_engine.build()
+        elif profile_index.stale():
+            await profile_index.refresh(db)
+
+
+def accept(user_ids: List[int], seen: SeenSet) -> List[int]:
+    # Порядок задаёт источник; оставляем только тех, у кого есть профиль, и ещё не свайпнутых
+    return [uid for uid in dict.fromkeys(user_ids) if uid in profile_index and uid not in seen][:FEED_DEPTH]
+
+
+async def local_rank(user_id: int, seen: SeenSet) -> List[int]:
+    # Локальная схожесть (разреженные матрицы по индексу)
+    return [uid for uid, _ in scoring_engine.rank(user_id, limit=FEED_DEPTH, exclude=seen)]
+
+
+async def hedged_rank(user_id: int, seen: SeenSet, ml_client: Optional[MLClient]) -> List[int]:
+    """
+    Ранжирование в момент запроса: ждём ML в пределах latency budget;
+    если не уложился — параллельно запускаем локальный скоринг, и побеждает
+    тот, кто закончит первым.
+    """
+    if ml_client is None:
+        return await local_rank(user_id, seen)
+
+    ml_task = asyncio.create_task(ml_results.get(user_id, ml_client.get_recommendations_for_user))
+    done, _ = await asyncio.wait({ml_task}, timeout=ml_client.latency_budget_s)
+    if not done:
+        ml_client.counters["hedged"] += 1
+        local_task = asyncio.create_task(local_rank(user_id, seen))
+        done, _ = await asyncio.wait({ml_task, local_task}, return_when=asyncio.FIRST_COMPLETED)
+        user_ids = accept(ml_task.result(), seen) if ml_task in done else []
+        if user_ids:
+            local_task.cancel()
+            ml_client.counters["hedge_ml_wins"] += 1
+            return user_ids
+        ml_task.cancel()
+        ml_client.counters["hedge_local_wins"] += 1
+        return await local_task
+
+    user_ids = accept(ml_task.result(), seen)
+    if user_ids:
+        return user_ids
+    # Фолбэк: ML ответил пусто или с ошибкой (в том числе при разомкнутой цепи)
+    return await local_rank(user_id, seen)
+
+
+async def rank_candidates(
+    db: AsyncSession,
+    user_id: int,
+    seen: SeenSet,
+    ml_client: Optional[MLClient],
+) -> List[int]:
+    """
+    Полный ранжированный список кандидатов (до FEED_DEPTH) для снимка выдачи.
+    Сначала — предпосчитанный набор из match_sets (одно чтение по индексу),
+    и только при промахе — ML/локальный скоринг в момент запроса.
+    """
+    precomputed = await match_sets.load(db, user_id)
+    if precomputed:
+        user_ids = accept(precomputed, seen)
+        if user_ids:
+            return user_ids
+    return await hedged_rank(user_id, seen, ml_client)
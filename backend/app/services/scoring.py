@@ -0,0 +1,143 @@
+# backend/app/services/scoring.py
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+try:
+    import numpy as np  # type: ignore
+    from scipy import sparse  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+    sparse = None  # type: ignore
+
+from .profile_index import ProfileIndex, compatibility, profile_index
+from .seen import SeenSet
+
+
+class ScoringEngine:
+    """
+    Векторизованный подсчёт совместимости поверх ProfileIndex.
+
+    Каждый фасет хранится как разреженная бинарная CSR-матрица
+    (строка — пользователь, столбец — токен из словаря фасета), поэтому
+    пересечения со всеми кандидатами считаются одним mat-vec на фасет,
+    а топ выбирается через argpartition.
+
+    Профили, изменённые после последней сборки, досчитываются точно по
+    множествам из индекса; матрицы пересобираются, когда таких профилей
+    становится слишком много. Без numpy/scipy движок просто делегирует
+    в ProfileIndex.rank.
+    """
+
+    def __init__(self, index: ProfileIndex, compact_min: int = 256, compact_ratio: float = 0.1) -> None:
+        self.index = index
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        self.vocab: List[Dict[str, int]] = [{}, {}, {}]
+        self.matrices: list = []
+        self.sizes: list = []
+        self.user_ids = None
+        self.built = False
+
+    @property
+    def available(self) -> bool:
+        return np is not None and sparse is not None
+
+    def build(self) -> None:
+        """Пересобирает CSR-матрицы из текущего состояния индекса."""
+        if not self.available:
+            return
+        users = list(self.index.facets.items())
+        self.user_ids = np.fromiter((uid for uid, _ in users), dtype=np.int64, count=len(users))
+        self.vocab = []
+        self.matrices = []
+        self.sizes = []
+        for f in range(3):
+            vocab = {token: col for col, token in enumerate(self.index.postings[f])}
+            indptr = np.zeros(len(users) + 1, dtype=np.int64)
+            indices: List[int] = []
+            for row, (_, facets) in enumerate(users):
+                tokens = facets[f]
+                indices.extend(vocab[t] for t in tokens)
+                indptr[row + 1] = indptr[row] + len(tokens)
+            data = np.ones(len(indices), dtype=np.int32)
+            matrix = sparse.csr_matrix(
+                (data, np.asarray(indices, dtype=np.int32), indptr),
+                shape=(len(users), max(len(vocab), 1)),
+            )
+            self.vocab.append(vocab)
+            self.matrices.append(matrix)
+            self.sizes.append(np.diff(indptr).astype(np.float64))
+        self.index.changed.clear()
+        self.built = True
+
+    def _needs_compaction(self) -> bool:
+        if not self.built:
+            return True
+        n = 0 if self.user_ids is None else len(self.user_ids)
+        return len(self.index.changed) > max(self.compact_min, int(n * self.compact_ratio))
+
+    def _query(self, f: int, tokens: Iterable[str]):
+        vocab = self.vocab[f]
+        q = np.zeros(self.matrices[f].shape[1], dtype=np.int32)
+        cols = [vocab[t] for t in tokens if t in vocab]
+        if cols:
+            q[cols] = 1
+        return q
+
+    def rank(self, user_id: int, limit: int = 50, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Топ-`limit` кандидатов для user_id: [(candidate_id, score), ...],
+        отсортированных по score (округлённому до 4 знаков) и user_id.
+        """
+        if not self.available:
+            return self.index.rank(user_id, limit=limit, exclude=exclude)
+        if self._needs_compaction():
+            self.build()
+        if limit <= 0 or self.user_ids is None:
+            return []
+
+        mine = self.index.get(user_id)
+        changed: Set[int] = set(self.index.changed)
+        if isinstance(exclude, SeenSet):
+            # array('I') отдаём в numpy без копирования
+            excluded = np.frombuffer(exclude.array, dtype=np.uint32)
+        else:
+            exclude = set(exclude)
+            excluded = np.fromiter(exclude, dtype=np.int64, count=len(exclude))
+
+        total = None
+        for f in range(3):
+            inter = (self.matrices[f] @ self._query(f, mine[f])).astype(np.float64)
+            union = len(mine[f]) + self.sizes[f] - inter
+            jacc = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+            total = jacc if total is None else total + jacc
+        # Округляем сразу: равенство score должно совпадать с итоговым порядком
+        scores = np.round(total / 3.0, 4)
+
+        # Строки пользователей, изменённых после сборки, и исключённых — выкидываем
+        masked = changed | {user_id}
+        scores[np.isin(self.user_ids, np.fromiter(masked, dtype=np.int64, count=len(masked)))] = -1.0
+        if len(excluded):
+            scores[np.isin(self.user_ids, excluded)] = -1.0
+
+        k = min(limit, len(scores))
+        top: List[Tuple[int, float]] = []
+        if k > 0:
+            kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            # Берём всех с score не ниже k-го: среди равных argpartition выбирает
+            # произвольно, а порядок должен быть детерминированным (score, user_id)
+            idx = np.flatnonzero(scores >= max(kth, 0.0))
+            idx = idx[np.lexsort((self.user_ids[idx], -scores[idx]))[:limit]]
+            top = [(int(self.user_ids[i]), float(scores[i])) for i in idx]
+
+        # Изменённые профили считаем точно по множествам из индекса
+        for uid in changed:
+            if uid != user_id and uid not in exclude and uid in self.index:
+                top.append((uid, compatibility(mine, self.index.get(uid))))
+
+        ranked = [(uid, round(score, 4)) for uid, score in top]
+        ranked.sort(key=lambda x: (-x[1], x[0]))
+        return ranked[:limit]
+
+
+scoring_engine = ScoringEngine(profile_index)
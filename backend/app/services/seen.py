@@ -0,0 +1,84 @@
+# backend/app/services/seen.py
+
+import os
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterable, Iterator, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Like
+
+SEEN_CACHE_USERS = int(os.getenv("SEEN_CACHE_USERS", "10000"))
+# Свайпы через другие воркеры видны не позже чем через столько секунд
+SEEN_CACHE_TTL_S = float(os.getenv("SEEN_CACHE_TTL_S", "60"))
+
+
+class SeenSet:
+    """Отсортированный array('I') с user_id анкет, которые пользователь уже свайпнул."""
+
+    __slots__ = ("array",)
+
+    def __init__(self, ids: Iterable[int] = ()) -> None:
+        self.array = array("I", sorted(set(ids)))
+
+    def __contains__(self, user_id: object) -> bool:
+        if not isinstance(user_id, int):
+            return False
+        i = bisect_left(self.array, user_id)
+        return i < len(self.array) and self.array[i] == user_id
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.array)
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def add(self, user_id: int) -> None:
+        i = bisect_left(self.array, user_id)
+        if i == len(self.array) or self.array[i] != user_id:
+            self.array.insert(i, user_id)
+
+
+class SeenSets:
+    """
+    LRU-кэш SeenSet по пользователям с TTL. Заполняется лениво из likes
+    (индекс по from_user_id) и дополняется эндпоинтами свайпов этого воркера;
+    свайпы, прошедшие через другие воркеры, подтягиваются по истечении TTL
+    или при refresh=True (перед ранжированием нового снимка).
+    """
+
+    def __init__(self, max_users: int = SEEN_CACHE_USERS, ttl_s: float = SEEN_CACHE_TTL_S) -> None:
+        self.max_users = max_users
+        self.ttl_s = ttl_s
+        self._sets: "OrderedDict[int, Tuple[SeenSet, float]]" = OrderedDict()
+
+    async def get(self, db: AsyncSession, user_id: int, refresh: bool = False) -> SeenSet:
+        entry = self._sets.get(user_id)
+        if entry is not None and not refresh and entry[1] > time.monotonic():
+            self._sets.move_to_end(user_id)
+            return entry[0]
+        res = await db.execute(select(Like.to_user_id).where(Like.from_user_id == user_id))
+        seen = SeenSet(res.scalars().all())
+        self._sets[user_id] = (seen, time.monotonic() + self.ttl_s)
+        self._sets.move_to_end(user_id)
+        while len(self._sets) > self.max_users:
+            self._sets.popitem(last=False)
+        return seen
+
+    def add(self, user_id: int, target_ids: Iterable[int]) -> None:
+        """Отмечает свайпы; если набор ещё не загружен, он подтянется из БД при чтении."""
+        entry = self._sets.get(user_id)
+        if entry is None:
+            return
+        for target_id in target_ids:
+            entry[0].add(target_id)
+
+    def clear(self) -> None:
+        self._sets.clear()
+
+
+seen_sets = SeenSets()
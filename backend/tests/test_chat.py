@@ -0,0 +1,67 @@
+# backend/tests/test_chat.py
+
+from sqlalchemy import create_engine, text
+
+from backend.app import migrations
+
+
+def open_chat(client, a, b):
+    (a_id, a_headers), (b_id, b_headers) = a, b
+    assert client.post("/swipe/", headers=a_headers, json={"target_user_id": b_id, "action": "like"}).status_code == 200
+    assert client.post("/swipe/", headers=b_headers, json={"target_user_id": a_id, "action": "like"}).json()["match"]
+    r = client.post("/chat/open", headers=a_headers, json={"target_user_id": b_id})
+    assert r.status_code == 200, r.text
+    return r.json()["conversation_id"]
+
+
+def inbox_item(client, headers, conversation_id):
+    items = client.get("/chat/inbox", headers=headers).json()["items"]
+    return next(i for i in items if i["conversation_id"] == conversation_id)
+
+
+def test_deleted_last_message_id_is_not_reused(client, signup):
+    a, b = signup("A"), signup("B")
+    cid = open_chat(client, a, b)
+
+    first = client.post(f"/chat/{cid}/messages", headers=a[1], json={"body": "one"}).json()
+    assert client.post(f"/chat/{cid}/read", headers=b[1], json={}).json()["last_read_id"] == first["id"]
+    assert client.delete(f"/chat/{cid}/messages/{first['id']}", headers=a[1]).status_code == 200
+
+    second = client.post(f"/chat/{cid}/messages", headers=a[1], json={"body": "two"}).json()
+    assert second["id"] > first["id"]
+
+    # Новое сообщение непрочитано и находится догрузкой после последнего известного id
+    assert inbox_item(client, b[1], cid)["unread_count"] == 1
+    page = client.get(f"/chat/{cid}/messages", headers=b[1], params={"after_id": first["id"]}).json()
+    assert [m["body"] for m in page["items"]] == ["two"]
+
+
+def test_migration_rebuilds_messages_with_autoincrement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        # Таблица сообщений в том виде, в каком её создавал create_all до миграции 7
+        conn.execute(text(
+            "CREATE TABLE messages (id INTEGER NOT NULL PRIMARY KEY, conversation_id INTEGER NOT NULL, "
+            "sender_id INTEGER NOT NULL, body TEXT NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+        ))
+        conn.execute(text("CREATE INDEX ix_messages_conversation_id ON messages (conversation_id)"))
+        migrations._baseline(conn)
+        migrations._conversation_inbox(conn)
+        migrations._messages_fts(conn)
+        conn.execute(text("INSERT INTO conversations (id, user1_id, user2_id) VALUES (1, 1, 2)"))
+        conn.execute(text("INSERT INTO messages (id, conversation_id, sender_id, body) VALUES (1, 1, 1, 'hello'), (2, 1, 2, 'bye')"))
+        # Сообщение 3 было прочитано и удалено до миграции
+        conn.execute(text("UPDATE conversations SET user2_last_read_id = 3"))
+
+        migrations._messages_autoincrement(conn)
+
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'messages'")).scalar()
+        assert "AUTOINCREMENT" in ddl
+        assert conn.execute(text("SELECT COUNT(*) FROM messages")).scalar() == 2
+        conn.execute(text("INSERT INTO messages (conversation_id, sender_id, body) VALUES (1, 1, 'again')"))
+        assert conn.execute(text("SELECT MAX(id) FROM messages")).scalar() == 4
+        # FTS-триггеры пересозданы и индексируют новые сообщения
+        hits = conn.execute(text("SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'again'")).all()
+        assert [h.rowid for h in hits] == [4]
+    engine.dispose()
+
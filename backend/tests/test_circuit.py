@@ -0,0 +1,175 @@
+# backend/tests/test_circuit.py
+# Запуск из корня репозитория: python -m pytest backend/tests
+
+import asyncio
+
+import pytest
+
+from backend.app.services import circuit, ranking
+from backend.app.services.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from backend.app.services.profile_index import ProfileIndex
+from backend.app.services.scoring import ScoringEngine
+from backend.app.services.seen import SeenSet
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit, "time", fake)
+    return fake
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    params = dict(failure_ratio=0.5, min_calls=4, window_s=30.0, slow_call_s=1.0, cooldown_s=10.0)
+    params.update(kwargs)
+    return CircuitBreaker(**params)
+
+
+# ---------- CircuitBreaker ----------
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_failure_ratio_and_rejects(clock):
+    breaker = make_breaker()
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok, 0.01)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.counters["rejected"] == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+    assert breaker.counters["failures"] == 0
+    assert breaker.counters["slow_calls"] == 4
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(False, 0.01)
+    clock.now += 31.0
+    breaker.allow()
+    breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(False, 0.01)
+    clock.now += 10.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Пока проба в полёте, остальные вызовы отклоняются
+    assert not breaker.allow()
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(False, 0.01)
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 2
+    assert not breaker.allow()
+
+
+# ---------- hedged_rank ----------
+class StubMLClient:
+    """Вместо ML-сервиса: отвечает заданным списком через delay_s секунд."""
+
+    def __init__(self, user_ids, delay_s: float = 0.0, latency_budget_s: float = 0.05) -> None:
+        self.user_ids = list(user_ids)
+        self.delay_s = delay_s
+        self.latency_budget_s = latency_budget_s
+        self.counters = {"hedged": 0, "hedge_ml_wins": 0, "hedge_local_wins": 0}
+        self.calls = 0
+
+    async def get_recommendations_for_user(self, user_id: int):
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        return self.user_ids
+
+
+class PassThroughResults:
+    """ml_results без кэша и записи в match_sets."""
+
+    async def get(self, user_id, fetch):
+        return await fetch(user_id)
+
+
+@pytest.fixture
+def local_index(monkeypatch):
+    index = ProfileIndex()
+    facets = {
+        1: ("python", "go", "startup"),
+        2: ("python", "go", "startup"),
+        3: ("python", "sql", "job"),
+        4: ("art", "design", "job"),
+    }
+    for uid, (interest, skill, goal) in facets.items():
+        index.upsert(uid, (frozenset([interest]), frozenset([skill]), frozenset([goal])))
+    monkeypatch.setattr(ranking, "profile_index", index)
+    monkeypatch.setattr(ranking, "scoring_engine", ScoringEngine(index))
+    monkeypatch.setattr(ranking, "ml_results", PassThroughResults())
+    return index
+
+
+def test_hedge_uses_ml_within_budget(local_index):
+    ml = StubMLClient([4, 3, 2])
+    result = asyncio.run(ranking.hedged_rank(1, SeenSet(), ml))
+    assert result == [4, 3, 2]
+    assert ml.counters["hedged"] == 0
+
+
+def test_hedge_filters_seen_and_unknown_ids(local_index):
+    ml = StubMLClient([99, 4, 3, 2])
+    result = asyncio.run(ranking.hedged_rank(1, SeenSet([3]), ml))
+    assert result == [4, 2]
+
+
+def test_hedge_local_wins_when_ml_is_slow(local_index):
+    ml = StubMLClient([4, 3, 2], delay_s=1.0, latency_budget_s=0.01)
+    result = asyncio.run(ranking.hedged_rank(1, SeenSet(), ml))
+    assert result[0] == 2
+    assert ml.counters["hedged"] == 1
+    assert ml.counters["hedge_local_wins"] == 1
+
+
+def test_empty_ml_answer_falls_back_to_local(local_index):
+    ml = StubMLClient([])
+    result = asyncio.run(ranking.hedged_rank(1, SeenSet(), ml))
+    assert result[:2] == [2, 3]
+    assert ml.calls == 1
+
+
+def test_no_ml_client_ranks_locally(local_index):
+    result = asyncio.run(ranking.hedged_rank(1, SeenSet([2]), None))
+    assert 2 not in result and result[0] == 3
@@ -0,0 +1,98 @@
+# backend/tests/test_concurrency.py
+"""
+Гонки, которые на SQLite снимает единственный писатель, а на PostgreSQL —
+ON CONFLICT и advisory-локи. Запросы идут параллельно в цикле приложения.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import func, select, text
+
+from backend.app.db import AsyncSessionLocal, engine, read_engine
+from backend.app.migrations import HEAD, current_version
+from backend.app.models import Match, Profile
+from backend.app.routers.likes import _lock_pairs, swipe
+from backend.app.routers.profile import get_profile
+from backend.app.schemas import SwipeRequest
+
+
+async def _in_session(fn, *args, **kwargs):
+    async with AsyncSessionLocal() as db:
+        return await fn(*args, db=db, **kwargs)
+
+
+def test_schema_is_at_head(client):
+    assert client.portal.call(current_version) == HEAD
+
+
+def test_concurrent_first_get_profile_creates_one_profile(client, signup):
+    user_id, _ = signup(with_profile=False)
+
+    async def race():
+        return await asyncio.gather(*[_in_session(get_profile, user_id=user_id) for _ in range(8)])
+
+    profiles = client.portal.call(race)
+    assert len({p["id"] for p in profiles}) == 1
+
+    async def count():
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(func.count()).where(Profile.user_id == user_id))).scalar()
+
+    assert client.portal.call(count) == 1
+
+
+def test_concurrent_opposite_likes_create_exactly_one_match(client, signup):
+    pairs = [(signup("A")[0], signup("B")[0]) for _ in range(5)]
+
+    def like(from_id, to_id):
+        payload = SwipeRequest(target_user_id=to_id, action="like")
+        return _in_session(swipe, payload, current_user_id=from_id)
+
+    async def race():
+        calls = []
+        for a, b in pairs:
+            calls += [like(a, b), like(b, a)]
+        return await asyncio.gather(*calls)
+
+    responses = client.portal.call(race)
+    # Хотя бы один из двух встречных лайков видит взаимность
+    for i in range(len(pairs)):
+        assert responses[2 * i].match or responses[2 * i + 1].match
+
+    async def matches(a, b):
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(func.count()).where(Match.user1_id == min(a, b), Match.user2_id == max(a, b))
+            )).scalar()
+
+    for a, b in pairs:
+        assert client.portal.call(matches, a, b) == 1
+
+
+def test_read_engine_rejects_writes(client):
+    if read_engine is engine:
+        pytest.skip("PostgreSQL без DATABASE_READ_URL читает из основного пула")
+
+    async def write():
+        async with read_engine.connect() as conn:
+            try:
+                await conn.execute(text("CREATE TABLE read_only_probe (id INTEGER)"))
+            except Exception:
+                return False
+            return True
+
+    assert client.portal.call(write) is False
+
+
+def test_pair_lock_is_held_until_commit(client, postgres_only):
+    async def probe():
+        async with AsyncSessionLocal() as holder, AsyncSessionLocal() as other:
+            await _lock_pairs(holder, 2, [1])
+            taken = (await other.execute(select(func.pg_try_advisory_xact_lock(1, 2)))).scalar()
+            await holder.commit()
+            after = (await other.execute(select(func.pg_try_advisory_xact_lock(1, 2)))).scalar()
+            await other.rollback()
+            return taken, after
+
+    assert client.portal.call(probe) == (False, True)
@@ -0,0 +1,77 @@
+# backend/tests/test_migrations.py
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend.app import migrations
+
+
+@pytest.fixture
+def conn(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        migrations._baseline(connection)
+        # Пользователи и профили из базы, заполненной до profile_tokens
+        connection.execute(text(
+            "INSERT INTO users (id, email, name, city, hashed_password) VALUES "
+            "(1, 'a@x', 'A', 'Msk', 'x'), (2, 'b@x', 'B', 'Spb', 'x'), (3, 'c@x', 'C', 'Msk', 'x')"
+        ))
+        connection.execute(text(
+            "INSERT INTO profiles (user_id, city, interests, skills, goals) VALUES "
+            "(1, 'Msk', 'Python, ML', 'go', 'startup'), "
+            "(2, 'Spb', 'python', 'go sql', ''), "
+            "(3, 'Msk', '', '', '')"
+        ))
+        yield connection
+    engine.dispose()
+
+
+def tokens_of(conn, user_id):
+    rows = conn.execute(text(
+        "SELECT pt.facet, t.text FROM profile_tokens pt JOIN tokens t ON t.id = pt.token_id "
+        "WHERE pt.user_id = :uid ORDER BY pt.facet, t.text"
+    ), {"uid": user_id}).all()
+    return [tuple(r) for r in rows]
+
+
+def test_profile_tokens_backfill(conn):
+    migrations._profile_tokens_backfill(conn)
+    assert tokens_of(conn, 1) == [("goals", "startup"), ("interests", "ml"), ("interests", "python"), ("skills", "go")]
+    assert tokens_of(conn, 2) == [("interests", "python"), ("skills", "go"), ("skills", "sql")]
+    assert tokens_of(conn, 3) == []
+    assert conn.execute(text("SELECT COUNT(*) FROM tokens WHERE text = 'python'")).scalar() == 1
+    # Повторный запуск ничего не дублирует
+    migrations._profile_tokens_backfill(conn)
+    assert len(tokens_of(conn, 1)) == 4
+
+
+def test_facet_counts_built_from_backfilled_tokens(conn):
+    migrations._profile_tokens_backfill(conn)
+    migrations._facet_counts_rebuild(conn)
+    counts = {
+        (r.facet, r.city, r.token): r.count
+        for r in conn.execute(text("SELECT facet, city, token, count FROM facet_counts")).all()
+    }
+    assert counts[("interests", "", "python")] == 2
+    assert counts[("skills", "", "go")] == 2
+    assert counts[("skills", "Spb", "sql")] == 1
+    assert counts[("interests", "Msk", "ml")] == 1
+    assert ("interests", "Msk", "python") in counts and ("interests", "Spb", "python") in counts
+
+
+def test_photo_variants_status_marks_processed_photos(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'photos.db'}")
+    with engine.begin() as connection:
+        # user_photos в том виде, в каком она была после миграции 6
+        connection.execute(text(
+            "CREATE TABLE user_photos (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "photo_path VARCHAR(500) NOT NULL, is_primary BOOLEAN, upload_order INTEGER, uploaded_at DATETIME, "
+            "avatar_path VARCHAR(500), card_path VARCHAR(500), full_path VARCHAR(500))"
+        ))
+        connection.execute(text(
+            "INSERT INTO user_photos (id, user_id, photo_path, avatar_path) VALUES (1, 1, 'a', 'a_avatar'), (2, 1, 'b', NULL)"
+        ))
+        migrations._photo_variants_status(connection)
+        rows = connection.execute(text("SELECT id, variants_status FROM user_photos ORDER BY id")).all()
+        assert [tuple(r) for r in rows] == [(1, "done"), (2, "pending")]
+    engine.dispose()
@@ -0,0 +1,47 @@
+# backend/tests/test_photos.py
+
+import io
+import time
+
+import pytest
+
+from backend.app.services.photo_variants import DONE, FAILED, PENDING, photo_pipeline
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def png_bytes() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), "red").save(buf, "PNG")
+    return buf.getvalue()
+
+
+def wait_processed(client, headers, timeout_s: float = 30):
+    deadline = time.monotonic() + timeout_s
+    while True:
+        items = client.get("/profile/photos", headers=headers).json()["items"]
+        if all(p["variants_status"] != PENDING for p in items) or time.monotonic() > deadline:
+            return {p["id"]: p for p in items}
+        time.sleep(0.1)
+
+
+def test_overflow_is_processed_and_broken_upload_is_marked_failed(client, signup, monkeypatch):
+    _, headers = signup()
+    # Одна задача за раз: остальные загрузки откладываются и догружаются из БД
+    monkeypatch.setattr(photo_pipeline, "queue_max", 1)
+
+    broken = client.post(
+        "/profile/photos", headers=headers, files={"file": ("broken.png", b"not an image", "image/png")}
+    ).json()["id"]
+    good = [
+        client.post(
+            "/profile/photos", headers=headers, files={"file": (f"p{i}.png", png_bytes(), "image/png")}
+        ).json()["id"]
+        for i in range(3)
+    ]
+
+    photos = wait_processed(client, headers)
+    assert photos[broken]["variants_status"] == FAILED
+    for photo_id in good:
+        assert photos[photo_id]["variants_status"] == DONE
+        assert photos[photo_id]["avatar_path"] != photos[photo_id]["photo_path"]
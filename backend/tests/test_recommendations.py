@@ -0,0 +1,59 @@
+# backend/tests/test_recommendations.py
+
+from sqlalchemy import insert, update
+
+from backend.app.db import AsyncSessionLocal
+from backend.app.models import Like, Profile
+from backend.app.services.profile_index import profile_index
+from backend.app.services.profile_tokens import facets_of, store_facets
+from backend.app.services.ranking import ensure_index
+
+
+def feed_ids(client, headers):
+    r = client.get("/recommendations/", headers=headers, params={"limit": 100})
+    assert r.status_code == 200, r.text
+    return [item["user"]["id"] for item in r.json()["items"]]
+
+
+def test_new_snapshot_excludes_swipes_made_through_another_worker(client, signup):
+    a_id, a_headers = signup("A")
+    b_id, b_headers = signup("B")
+    for _, headers in ((a_id, a_headers), (b_id, b_headers)):
+        r = client.put("/profile", headers=headers, json={"interests": "chess go", "skills": "python"})
+        assert r.status_code == 200, r.text
+    assert b_id in feed_ids(client, a_headers)
+
+    # Лайк записан другим воркером: кэш этого процесса о нём не знает
+    async def like_elsewhere():
+        async with AsyncSessionLocal() as db:
+            db.add(Like(from_user_id=a_id, to_user_id=b_id, is_like=True))
+            await db.commit()
+
+    client.portal.call(like_elsewhere)
+    assert b_id not in feed_ids(client, a_headers)
+
+
+def test_index_picks_up_profiles_changed_through_another_worker(client, signup, monkeypatch):
+    a_id, _ = signup("A")
+    b_id, _ = signup("B", with_profile=False)
+
+    # Профиль B создан и заполнен другим воркером: индекс этого процесса о нём не знает
+    async def edit_elsewhere():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Profile).values(user_id=b_id, interests="chess"))
+            await store_facets(db, b_id, facets_of("chess", "", ""))
+            await db.execute(update(Profile).where(Profile.user_id == a_id).values(skills="rust"))
+            await store_facets(db, a_id, facets_of("", "rust", ""))
+            await db.commit()
+
+    client.portal.call(edit_elsewhere)
+    assert b_id not in profile_index
+
+    async def refresh():
+        async with AsyncSessionLocal() as db:
+            await ensure_index(db)
+
+    monkeypatch.setattr(profile_index, "_refreshed_at", float("-inf"))
+    client.portal.call(refresh)
+    assert profile_index.get(b_id) == facets_of("chess", "", "")
+    assert profile_index.get(a_id) == facets_of("", "rust", "")
@@ -189,11 +189,56 @@ export async function openChat(token, targetUserId) {
   return handle(res);
 }
 
-export async function listMessages(token, conversationId) {
-  const res = await fetch(`${API}/chat/${conversationId}/messages`, { headers: { ...authHeaders(token) } });
+// { items, next_cursor }: без курсора — последние сообщения,
+// beforeId — более старые, afterId — новые после последнего известного
+export async function listMessages(token, conversationId, { beforeId, afterId, limit } = {}) {
+  const q = new URLSearchParams();
+  if (beforeId) q.set("before_id", String(beforeId));
+  if (afterId) q.set("after_id", String(afterId));
+  if (limit) q.set("limit", String(limit));
+  const url = `${API}/chat/${conversationId}/messages${q.toString() ? `?${q.toString()}` : ""}`;
+  const res = await fetch(url, { headers: { ...authHeaders(token) } });
   return handle(res);
 }
 
+// Инбокс: { items: [{ conversation_id, partner, last_message, unread_count }], next_cursor }
+export async function listInbox(token, { cursor, limit } = {}) {
+  const q = new URLSearchParams();
+  if (cursor) q.set("cursor", cursor);
+  if (limit) q.set("limit", String(limit));
+  const res = await fetch(`${API}/chat/inbox${q.toString() ? `?${q.toString()}` : ""}`, { headers: { ...authHeaders(token) } });
+  return handle(res);
+}
+
+export async function markRead(token, conversationId, messageId) {
+  const res = await fetch(`${API}/chat/${conversationId}/read`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", ...authHeaders(token) },
+    body: JSON.stringify(messageId ? { message_id: messageId } : {}),
+  });
+  return handle(res);
+}
+
+// Поиск по своим сообщениям: { items, next_cursor } по релевантности
+export async function searchMessages(token, q, { cursor, limit } = {}) {
+  const params = new URLSearchParams({ q });
+  if (cursor) params.set("cursor", cursor);
+  if (limit) params.set("limit", String(limit));
+  const res = await fetch(`${API}/chat/search?${params.toString()}`, { headers: { ...authHeaders(token) } });
+  return handle(res);
+}
+
+// Push-события чатов: { type: "message" | "message_deleted" | "resync", ... }
+// На "resync" догрузите историю через listMessages(..., { afterId })
+export function openChatSocket(token, onEvent) {
+  const url = `${API.replace(/^http/, "ws")}/chat/ws?token=${encodeURIComponent(token)}`;
+  const ws = new WebSocket(url);
+  ws.onmessage = (e) => {
+    try { onEvent(JSON.parse(e.data)); } catch { /* не JSON — пропускаем */ }
+  };
+  return ws;
+}
+
 export async function sendMessage(token, conversationId, body) {
   const res = await fetch(`${API}/chat/${conversationId}/messages`, {
     method: "POST",
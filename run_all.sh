@@ -9,6 +9,8 @@ source .venv/bin/activate
 pip install --upgrade pip
 pip install -r requirements.txt
 cd ..
+# Миграции схемы БД (при старте сервер только проверяет версию)
+./backend/.venv/bin/python -m backend.app.migrations
 
 # ---------- Frontend ----------
 cd frontend